@@ -19,6 +19,64 @@ RABBITMQ_HOST = os.getenv('RABBITMQ_HOST', 'localhost' if DEVELOPMENT else 'rabb
 RABBITMQ_PORT = int(os.getenv('RABBITMQ_PORT', 5672))
 RABBITMQ_USERNAME = os.getenv('RABBITMQ_USERNAME', 'guest')
 RABBITMQ_PASSWORD = os.getenv('RABBITMQ_PASSWORD', 'guest')
+RABBITMQ_HEARTBEAT = int(os.getenv('RABBITMQ_HEARTBEAT', 60))  # Seconds, for the pooled publisher in utils/rabbitmq.py
+RABBITMQ_BLOCKED_TIMEOUT = int(os.getenv('RABBITMQ_BLOCKED_TIMEOUT', 30))  # Seconds a publish may wait while the broker blocks
+RABBITMQ_TOKEN_QUEUE_GRACE = int(os.getenv('RABBITMQ_TOKEN_QUEUE_GRACE', 900))  # Seconds an unused token queue outlives its token
+RABBITMQ_MANAGEMENT_URL = os.getenv('RABBITMQ_MANAGEMENT_URL', f'http://{RABBITMQ_HOST}:15672')  # For reconcile_token_queues
+RABBITMQ_VHOST = os.getenv('RABBITMQ_VHOST', '/')
+
+# Roboservice terminal polling
+ROBOSERVICE_POLL_CONCURRENCY = int(os.getenv('ROBOSERVICE_POLL_CONCURRENCY', 16))
+ROBOSERVICE_POLL_PER_HOST = int(os.getenv('ROBOSERVICE_POLL_PER_HOST', 2))
+ROBOSERVICE_POLL_DEADLINE = float(os.getenv('ROBOSERVICE_POLL_DEADLINE', 10))  # Seconds per terminal
+ROBOSERVICE_CONNECT_TIMEOUT = float(os.getenv('ROBOSERVICE_CONNECT_TIMEOUT', 3))
+ROBOSERVICE_POLL_MIN_INTERVAL = float(os.getenv('ROBOSERVICE_POLL_MIN_INTERVAL', 30))  # Seconds, busy terminals
+ROBOSERVICE_POLL_MAX_INTERVAL = float(os.getenv('ROBOSERVICE_POLL_MAX_INTERVAL', 600))  # Seconds, quiet terminals
+ROBOSERVICE_POLL_MAX_BACKOFF = float(os.getenv('ROBOSERVICE_POLL_MAX_BACKOFF', 3600))  # Seconds, unreachable terminals
+ROBOSERVICE_POLL_STATUS_FILE = os.getenv('ROBOSERVICE_POLL_STATUS_FILE') or os.path.join(BASE_DIR, 'poll_scheduler_status.json')
+
+# Signal table partitioning (see home/partitions.py)
+SIGNAL_PARTITION_MONTHS_AHEAD = int(os.getenv('SIGNAL_PARTITION_MONTHS_AHEAD', 3))
+SIGNAL_RETENTION_MONTHS = int(os.getenv('SIGNAL_RETENTION_MONTHS', 12))  # 0 keeps every partition
+SIGNAL_ARCHIVE_EXPIRED = os.getenv('SIGNAL_ARCHIVE_EXPIRED', 'False') == 'True'
+LATENCY_MINUTE_RETENTION_DAYS = int(os.getenv('LATENCY_MINUTE_RETENTION_DAYS', 14))  # Hour histograms are kept
+
+# Signal limit alerts (see home/limits.py)
+SIGNAL_LIMIT_CACHE_TTL = float(os.getenv('SIGNAL_LIMIT_CACHE_TTL', 60))  # Seconds before limits are reloaded
+SIGNAL_LIMIT_ALERT_COOLDOWN = int(os.getenv('SIGNAL_LIMIT_ALERT_COOLDOWN', 900))  # Seconds between alerts per limit
+
+# Client token cache (see home/tokens.py)
+CLIENT_TOKEN_CACHE_TTL = float(os.getenv('CLIENT_TOKEN_CACHE_TTL', 30))  # Seconds
+CLIENT_TOKEN_CACHE_SIZE = int(os.getenv('CLIENT_TOKEN_CACHE_SIZE', 10000))  # Entries per process
+
+# Terminal heartbeats (see home/heartbeats.py)
+HEARTBEAT_FLUSH_INTERVAL = float(os.getenv('HEARTBEAT_FLUSH_INTERVAL', 5))  # Seconds between last_seen writes
+HEARTBEAT_STATE_TTL = float(os.getenv('HEARTBEAT_STATE_TTL', 60))  # Seconds terminal and OnlineUser ids are cached
+
+# Offline terminal sweep (see home/presence.py and the check_offline_terminals command)
+OFFLINE_TERMINAL_TIMEOUT = float(os.getenv('OFFLINE_TERMINAL_TIMEOUT', 120))  # Seconds without a heartbeat
+OFFLINE_TERMINAL_SWEEP_INTERVAL = float(os.getenv('OFFLINE_TERMINAL_SWEEP_INTERVAL', 60))  # Seconds, when not run with --once
+
+# Live notification status stream (see home/status_feed.py and the notification_status_stream view)
+NOTIFICATION_STREAM_MAX_AGE = int(os.getenv('NOTIFICATION_STREAM_MAX_AGE', 300))  # Seconds before a stream ends and the browser reconnects
+NOTIFICATION_STREAM_KEEPALIVE = int(os.getenv('NOTIFICATION_STREAM_KEEPALIVE', 15))  # Seconds between keepalive comments
+NOTIFICATION_STREAM_RETRY = int(os.getenv('NOTIFICATION_STREAM_RETRY', 5))  # Seconds the browser waits before reconnecting
+# Open streams each hold a gunicorn thread; keep most threads free for other requests and terminal heartbeats
+NOTIFICATION_STREAM_MAX_CONCURRENT = int(os.getenv('NOTIFICATION_STREAM_MAX_CONCURRENT', max(1, int(os.getenv('GUNICORN_THREADS', 32)) // 4)))
+NOTIFICATION_STATUS_POLL_INTERVAL = int(os.getenv('NOTIFICATION_STATUS_POLL_INTERVAL', 30))  # Seconds between polls of pages the stream refused
+
+# Notification outbox (see home/outbox.py and the dispatch_notifications command)
+NOTIFICATION_OUTBOX_BATCH_SIZE = int(os.getenv('NOTIFICATION_OUTBOX_BATCH_SIZE', 200))
+NOTIFICATION_OUTBOX_POLL_INTERVAL = float(os.getenv('NOTIFICATION_OUTBOX_POLL_INTERVAL', 1))  # Seconds between checks when idle
+NOTIFICATION_OUTBOX_MAX_ATTEMPTS = int(os.getenv('NOTIFICATION_OUTBOX_MAX_ATTEMPTS', 20))
+NOTIFICATION_OUTBOX_MAX_BACKOFF = float(os.getenv('NOTIFICATION_OUTBOX_MAX_BACKOFF', 600))  # Seconds between retries
+NOTIFICATION_OUTBOX_RETENTION_DAYS = int(os.getenv('NOTIFICATION_OUTBOX_RETENTION_DAYS', 7))  # Sent rows are deleted after this
+NOTIFICATION_OUTBOX_LEASE = float(os.getenv('NOTIFICATION_OUTBOX_LEASE', 300))  # Seconds a claimed batch is left to its dispatcher
+
+# Notification response consumer (see the consume_notifications command)
+NOTIFICATION_CONSUMER_PREFETCH = int(os.getenv('NOTIFICATION_CONSUMER_PREFETCH', 100))
+NOTIFICATION_CONSUMER_BATCH_SIZE = int(os.getenv('NOTIFICATION_CONSUMER_BATCH_SIZE', 50))
+NOTIFICATION_CONSUMER_BATCH_WINDOW = float(os.getenv('NOTIFICATION_CONSUMER_BATCH_WINDOW', 0.2))  # Seconds
 
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'noreply@example.com')
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -27,6 +85,15 @@ EMAIL_PORT = int(os.getenv('EMAIL_PORT', 587))  # Typically 587 for TLS
 EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True') == 'True'
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_TIMEOUT = int(os.getenv('EMAIL_TIMEOUT', 30))  # Seconds; bounds how long one SMTP call can hold a batch
+
+# Email queue (see home/emails.py and the send_queued_emails command)
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', 50))  # Emails per SMTP connection
+EMAIL_OUTBOX_POLL_INTERVAL = float(os.getenv('EMAIL_OUTBOX_POLL_INTERVAL', 5))  # Seconds between checks when idle
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', 10))
+EMAIL_OUTBOX_MAX_BACKOFF = float(os.getenv('EMAIL_OUTBOX_MAX_BACKOFF', 1800))  # Seconds between retries
+EMAIL_OUTBOX_RETENTION_DAYS = int(os.getenv('EMAIL_OUTBOX_RETENTION_DAYS', 30))  # Sent emails are deleted after this
+EMAIL_OUTBOX_LEASE = float(os.getenv('EMAIL_OUTBOX_LEASE', 3600))  # Seconds a claimed batch is left to its worker; keep above batch size x EMAIL_TIMEOUT
 
 # Application definition
 
@@ -126,6 +193,43 @@ DATABASES = {
     },
 }
 
+# SQLAlchemy engines for pandas/report queries, one pooled engine per database alias (see utils/db_engines.py)
+SQLALCHEMY_DATABASE_URLS = {
+    'external_db': os.getenv('EXTERNAL_DATABASE_URL', ''),  # Empty: built from DATABASES['external_db']
+}
+SQLALCHEMY_POOL_SIZE = int(os.getenv('SQLALCHEMY_POOL_SIZE', 10))  # Connections kept open per engine
+SQLALCHEMY_POOL_MAX_OVERFLOW = int(os.getenv('SQLALCHEMY_POOL_MAX_OVERFLOW', 20))  # Extra connections allowed under load
+SQLALCHEMY_POOL_TIMEOUT = float(os.getenv('SQLALCHEMY_POOL_TIMEOUT', 30))  # Seconds to wait for a free connection
+SQLALCHEMY_POOL_RECYCLE = int(os.getenv('SQLALCHEMY_POOL_RECYCLE', 1800))  # Seconds before a connection is replaced
+SQLALCHEMY_POOL_PRE_PING = os.getenv('SQLALCHEMY_POOL_PRE_PING', 'True') == 'True'  # Test connections on checkout
+
+# Result cache for expensive report computations (see utils/result_cache.py)
+RESULT_CACHE_ALIAS = 'results'
+RESULT_CACHE_BACKEND = os.getenv('RESULT_CACHE_BACKEND', 'locmem')  # locmem, file or redis (needs the redis package)
+RESULT_CACHE_LOCATION = os.getenv('RESULT_CACHE_LOCATION', '')  # Directory for file, URL for redis
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', 200))  # Entries kept before the oldest are culled
+RESULT_CACHE_TIMEOUT = int(os.getenv('RESULT_CACHE_TIMEOUT', 900))  # Seconds; upper bound for data without table statistics
+RESULT_CACHE_VERSION_TTL = float(os.getenv('RESULT_CACHE_VERSION_TTL', 30))  # Seconds between source table version checks
+PLAN_TABLE_MAX_PAIRS = int(os.getenv('PLAN_TABLE_MAX_PAIRS', 20000))  # (stroj, artikel) pairs of plan rows kept per process (utils/plan_table.py)
+
+RESULT_CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'results'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', os.path.join(BASE_DIR, 'result_cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://localhost:6379/1'),
+}
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    RESULT_CACHE_ALIAS: {
+        'BACKEND': RESULT_CACHE_BACKENDS[RESULT_CACHE_BACKEND][0],
+        'LOCATION': RESULT_CACHE_LOCATION or RESULT_CACHE_BACKENDS[RESULT_CACHE_BACKEND][1],
+        'TIMEOUT': RESULT_CACHE_TIMEOUT,
+        # Redis bounds memory with its own maxmemory eviction policy instead
+        'OPTIONS': {} if RESULT_CACHE_BACKEND == 'redis' else {'MAX_ENTRIES': RESULT_CACHE_MAX_ENTRIES},
+    },
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -1,9 +1,18 @@
 # gunicorn-cfg.py
+import os
 
 bind = "0.0.0.0:8010"  # Make Gunicorn listen on all network interfaces
 workers = 1  # Or use `multiprocessing.cpu_count() * 2 + 1` for dynamic scaling
+worker_class = 'gthread'  # Open notification status streams (server-sent events) each hold a thread, not the whole worker
+threads = int(os.getenv('GUNICORN_THREADS', 32))  # At most NOTIFICATION_STREAM_MAX_CONCURRENT (a quarter by default) serve streams
 accesslog = '-'  # Keep standard logging
 loglevel = 'info'  # Lower logging level for production
 capture_output = True
 enable_stdio_inheritance = True
 forwarded_allow_ips = '*'  # Trust all proxies
+
+
+def worker_exit(server, worker):
+    # Return the worker's pooled SQLAlchemy connections instead of leaving them to the database to time out
+    from utils.db_engines import dispose_engines
+    dispose_engines()
@@ -0,0 +1,171 @@
+# home/emails.py
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import EmailOutbox
+from .outbox import claim_batch, settle_batch
+
+logger = logging.getLogger('home')
+
+NOTIFICATION_EMAIL_TEMPLATE = 'notifications/email_template.html'
+RESPONSE_EMAIL_TEMPLATE = 'notifications/response_notification_email.html'
+
+
+def user_context(user):
+    """The fields of a user the email templates use, as JSON."""
+    if user is None:
+        return None
+    obrat_oddelek = user.obrat_oddelek
+    return {
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'obrat_oddelek': {'obrat': obrat_oddelek.obrat, 'oddelek': obrat_oddelek.oddelek} if obrat_oddelek else None,
+    }
+
+
+def format_time(value):
+    return timezone.localtime(value).strftime('%d.%m.%Y %H:%M:%S') if value else None
+
+
+def build_email(recipient_email, subject, template, context):
+    """An unsaved EmailOutbox row, for callers that bulk_create several at once."""
+    return EmailOutbox(recipient_email=recipient_email, subject=subject[:255], template=template, context=context)
+
+
+def queue_email(recipient_email, subject, template, context):
+    """Queue an email for the send_queued_emails worker."""
+    email = build_email(recipient_email, subject, template, context)
+    email.save()
+    return email
+
+
+def queue_notification_email(recipient, subject, message_content, sender_user=None):
+    """
+    Queue a notification email to a user.
+
+    Raises ValueError when the user has no email address.
+    """
+    if not recipient.email:
+        raise ValueError("Recipient must have a valid email address")
+    queue_email(recipient.email, subject, NOTIFICATION_EMAIL_TEMPLATE, {
+        'recipient': user_context(recipient),
+        'sender_user': str(sender_user) if sender_user else '',
+        'notification_content': message_content,
+    })
+
+
+def queue_signal_limit_email(email, subject, message_content, recipient=None):
+    """Queue a SignalLimit alert to `email`; `recipient` (the owner of the limit) is only used for the greeting."""
+    queue_email(email, subject, NOTIFICATION_EMAIL_TEMPLATE, {
+        'recipient': user_context(recipient),
+        'sender_user': 'Signali strojev',
+        'notification_content': message_content,
+    })
+
+
+def build_response_email(notification):
+    """The email telling the sender of a notification that it was answered, or None if they have no address."""
+    if not notification.sender_user.email:
+        return None
+    terminal = notification.receiver_terminal
+    return build_email(
+        notification.sender_user.email,
+        f"Response to Your Notification: {notification.key}",
+        RESPONSE_EMAIL_TEMPLATE,
+        {
+            'sender': user_context(notification.receiver_user),
+            'notification': {'key': notification.key},
+            'notification_content': notification.notification_content,
+            'reply_content': notification.reply_content,
+            'timestamp': format_time(notification.time_replied),
+            'terminal_info': {
+                'terminal_hostname': terminal.terminal_hostname,
+                # .all() so the consumer's prefetch of receiver_terminal__terminal_machines is used
+                'machine': ', '.join(machine.machine_name for machine in terminal.terminal_machines.all()),
+            } if terminal else None,
+        },
+    )
+
+
+def render_email(email, rendered):
+    """Render an email, reusing `rendered` for emails with the same template and context."""
+    key = (email.template, json.dumps(email.context, sort_keys=True))
+    if key not in rendered:
+        html_content = render_to_string(email.template, email.context)
+        rendered[key] = (strip_tags(html_content), html_content)
+    text_content, html_content = rendered[key]
+    message = EmailMultiAlternatives(email.subject, text_content, settings.DEFAULT_FROM_EMAIL, [email.recipient_email])
+    message.attach_alternative(html_content, 'text/html')
+    return message
+
+
+def deliver_queued_emails(batch_size=None, max_attempts=None):
+    """
+    Send one batch of due queued emails over a single SMTP connection and return `(sent, failed)`.
+
+    The batch is claimed for EMAIL_OUTBOX_LEASE seconds and sent outside any transaction.
+    Emails with the same template and context are rendered once. A message that fails is
+    rescheduled with backoff (or marked failed after `max_attempts`) and the next one gets a fresh
+    connection; if the server cannot be reached at all, the rest of the batch is rescheduled
+    without trying.
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    max_attempts = max_attempts or settings.EMAIL_OUTBOX_MAX_ATTEMPTS
+
+    emails = claim_batch(EmailOutbox, batch_size, settings.EMAIL_OUTBOX_LEASE)
+    if not emails:
+        return 0, 0
+
+    connection = get_connection()
+    rendered = {}
+    sent, failed = [], []
+    smtp_error = None
+    for email in emails:
+        if smtp_error:
+            # The server is unreachable; do not wait for a timeout once per email
+            email.last_error = smtp_error
+            failed.append(email)
+            continue
+        try:
+            message = render_email(email, rendered)
+        except Exception as e:
+            logger.error(f"Error rendering email {email.pk} ({email.template}): {e!r}")
+            email.last_error = repr(e)
+            failed.append(email)
+            continue
+        try:
+            # A no-op while the connection is open; send_messages then leaves it open
+            connection.open()
+        except Exception as e:
+            logger.warning(f"Cannot connect to the mail server: {e!r}")
+            smtp_error = email.last_error = repr(e)
+            failed.append(email)
+            continue
+        try:
+            connection.send_messages([message])
+            sent.append(email)
+        except Exception as e:
+            logger.warning(f"Error sending email {email.pk} to {email.recipient_email}: {e!r}")
+            email.last_error = repr(e)
+            failed.append(email)
+            # Start the next message on a fresh connection
+            connection.close()
+    connection.close()
+
+    settle_batch(EmailOutbox, sent, failed, max_attempts, settings.EMAIL_OUTBOX_MAX_BACKOFF)
+    return len(sent), len(failed)
+
+
+def purge_sent_emails(now=None):
+    """Delete sent emails older than EMAIL_OUTBOX_RETENTION_DAYS."""
+    cutoff = (now or timezone.now()) - timedelta(days=settings.EMAIL_OUTBOX_RETENTION_DAYS)
+    deleted, _ = EmailOutbox.objects.filter(status='sent', sent_at__lt=cutoff).delete()
+    return deleted
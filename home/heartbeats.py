@@ -0,0 +1,123 @@
+# home/heartbeats.py
+import atexit
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection
+
+from .models import OnlineUser, Terminal
+
+logger = logging.getLogger('home')
+
+# What a heartbeat is checked against; online_user_id and user_id are None when the terminal is not paired
+TerminalState = namedtuple('TerminalState', ['terminal_id', 'online_user_id', 'user_id'])
+
+
+class TerminalStateCache:
+    """
+    Per-hostname terminal and OnlineUser ids, kept for `ttl` seconds.
+
+    Tokens are checked through home.tokens.token_cache.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = settings.HEARTBEAT_STATE_TTL if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._states = {}  # hostname -> (loaded_at, TerminalState)
+
+    def get(self, hostname):
+        """Return the TerminalState of `hostname`, or None when no such terminal exists."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._states.get(hostname)
+        if cached and now - cached[0] < self.ttl:
+            return cached[1]
+
+        state = self._load(hostname)
+        with self._lock:
+            if state and state.online_user_id:
+                self._states[hostname] = (now, state)
+            else:
+                # Incomplete states are not cached; the terminal may be paired any moment
+                self._states.pop(hostname, None)
+        return state
+
+    def _load(self, hostname):
+        terminal_id = Terminal.objects.filter(terminal_hostname=hostname).values_list('id', flat=True).first()
+        if terminal_id is None:
+            return None
+        online_user = OnlineUser.objects.filter(terminal_id=terminal_id, is_terminal=True).order_by('pk').values('id', 'user_id').first()
+        if online_user is None:
+            return TerminalState(terminal_id, None, None)
+        return TerminalState(terminal_id, online_user['id'], online_user['user_id'])
+
+    def invalidate(self, hostname=None):
+        with self._lock:
+            if hostname is None:
+                self._states.clear()
+            else:
+                self._states.pop(hostname, None)
+
+
+class HeartbeatBuffer:
+    """
+    Collects OnlineUser.last_seen values and writes them with one bulk UPDATE per `flush_interval`.
+
+    The heartbeat that finds the interval elapsed does the flush, so the write rate depends on the
+    interval rather than on the number of terminals. Whatever is still buffered is written at exit.
+    A heartbeat also clears a sign_out_time older than itself, so a session the offline sweep
+    (home/presence.py) signed out comes back online as soon as the terminal is heard from again,
+    while a sign-out (or sweep) that came after the buffered beat stays in place.
+    """
+
+    def __init__(self, flush_interval=None):
+        self.flush_interval = settings.HEARTBEAT_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self._lock = threading.Lock()
+        self._pending = {}  # OnlineUser id -> last_seen
+        self._next_flush = time.monotonic() + self.flush_interval
+
+    def record(self, online_user_id, seen_at):
+        with self._lock:
+            self._pending[online_user_id] = seen_at
+            due = time.monotonic() >= self._next_flush
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered last_seen values; returns the number of rows updated."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._next_flush = time.monotonic() + self.flush_interval
+        if not pending:
+            return 0
+
+        online_users = connection.ops.quote_name(OnlineUser._meta.db_table)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    UPDATE {online_users} o
+                    SET last_seen = v.seen_at,
+                        sign_out_time = CASE WHEN o.sign_out_time < v.seen_at THEN NULL ELSE o.sign_out_time END
+                    FROM (VALUES {', '.join(['(%s::integer, %s::timestamptz)'] * len(pending))}) AS v (id, seen_at)
+                    WHERE o.id = v.id
+                    """,
+                    [value for item in pending.items() for value in item],
+                )
+                updated = cursor.rowcount
+        except Exception as e:
+            logger.error(f"Error writing {len(pending)} heartbeats: {e}")
+            with self._lock:
+                # Keep them for the next flush unless a newer heartbeat arrived meanwhile
+                for online_user_id, seen_at in pending.items():
+                    self._pending.setdefault(online_user_id, seen_at)
+            return 0
+        return updated
+
+
+terminal_states = TerminalStateCache()
+heartbeat_buffer = HeartbeatBuffer()
+atexit.register(heartbeat_buffer.flush)
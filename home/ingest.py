@@ -0,0 +1,155 @@
+# home/ingest.py
+from django.db import transaction
+from django.db.models import Q
+
+from utils.parsers import parse_signal_message
+from .latency import record_latencies
+from .limits import evaluate_limits
+from .measurements import build_signal_measurements
+from .models import Signal, SignalMeasurement, Terminal, TerminalSignalSummary
+
+
+def ingest_terminal_logs(terminal, raw_data, log_parser, parse_first_get_and_put=False):
+    """
+    Parse a roboservice log page and store the rows newer than the terminal's high-water mark.
+
+    `terminal.last_signal_timestamp` marks the newest row ingested so far. The parser stops
+    as soon as it reaches that mark, so only new rows are parsed and inserted; the mark is
+    then moved forward in the same transaction, together with the measurements carried by
+    new PUT rows. Those measurements are then checked against the terminal's SignalLimits.
+    Returns the list of Signal objects that were actually inserted.
+
+    `parse_first_get_and_put` only applies to a terminal without a mark yet, to keep its first
+    poll from ingesting the whole page history. Once there is a mark every newer row is parsed;
+    stopping early would move the mark past rows that were never stored.
+    """
+    since = terminal.last_signal_timestamp
+    parsed_logs = log_parser.parse_html_logs(
+        raw_data,
+        parse_first_get_and_put=parse_first_get_and_put and since is None,
+        since=since,
+    )
+    if not parsed_logs:
+        return []
+
+    parsed_signals = [
+        Signal(
+            terminal=terminal,
+            timestamp=parsed_log['timestamp'],  # Already an aware datetime
+            level=parsed_log['label'],
+            message=parsed_log['message'],
+            **parse_signal_message(parsed_log['message']),
+        )
+        for parsed_log in parsed_logs
+    ]
+    newest_timestamp = max(signal.timestamp for signal in parsed_signals)
+
+    with transaction.atomic():
+        # Overlapping polls of the same terminal take turns here, so each sees the rows the other stored
+        list(Terminal.objects.select_for_update().filter(pk=terminal.pk).values_list('pk', flat=True))
+        # Counters, histograms and measurements are fed only the rows that are really inserted
+        new_signals = unstored_signals(terminal, parsed_signals)
+        measurements = build_signal_measurements(terminal, new_signals)
+        # ignore_conflicts only guards against writers that do not take the lock above
+        Signal.objects.bulk_create(new_signals, ignore_conflicts=True)
+        SignalMeasurement.objects.bulk_create(measurements, batch_size=1000, ignore_conflicts=True)
+        # Only ever move the mark forward, in case a slower overlapping poll finishes last
+        Terminal.objects.filter(pk=terminal.pk).filter(
+            Q(last_signal_timestamp__isnull=True) | Q(last_signal_timestamp__lt=newest_timestamp)
+        ).update(last_signal_timestamp=newest_timestamp)
+        update_signal_summary(terminal, new_signals)
+        record_latencies(terminal, new_signals)
+
+    terminal.last_signal_timestamp = newest_timestamp
+    evaluate_limits(terminal, measurements)
+    return new_signals
+
+
+def unstored_signals(terminal, signals):
+    """`signals` without the ones already stored or repeated in the batch; (timestamp, message) is unique per terminal."""
+    if not signals:
+        return []
+    seen = set(
+        Signal.objects.filter(
+            terminal=terminal,
+            timestamp__range=(min(signal.timestamp for signal in signals), max(signal.timestamp for signal in signals)),
+        ).values_list('timestamp', 'message')
+    )
+    new_signals = []
+    for signal in signals:
+        key = (signal.timestamp, signal.message)
+        if key not in seen:
+            seen.add(key)
+            new_signals.append(signal)
+    return new_signals
+
+
+def pollable_terminals():
+    """Terminals that have a roboservice to poll."""
+    return Terminal.objects.exclude(roboservice_url__isnull=True).exclude(roboservice_url='')
+
+
+def ingest_fetch_result(terminal, result, log_parser, parse_first_get_and_put=False):
+    """
+    Ingest a utils.polling.FetchResult and remember its HTTP validators.
+
+    A 304 Not Modified or an empty page is not parsed. Validators are stored only after the
+    page was ingested, so a failed ingest is fetched in full again. Returns the new signals.
+    """
+    new_signals = []
+    if result.text is not None and result.text.strip():
+        new_signals = ingest_terminal_logs(terminal, result.text, log_parser, parse_first_get_and_put)
+
+    if (result.etag, result.last_modified) != (terminal.roboservice_etag, terminal.roboservice_last_modified):
+        Terminal.objects.filter(pk=terminal.pk).update(
+            roboservice_etag=result.etag,
+            roboservice_last_modified=result.last_modified,
+        )
+        terminal.roboservice_etag = result.etag
+        terminal.roboservice_last_modified = result.last_modified
+    return new_signals
+
+
+def update_signal_summary(terminal, signals):
+    """Fold a batch of newly ingested signals into the terminal's TerminalSignalSummary row."""
+    get_signals = [signal for signal in signals if signal.verb == 'GET']
+    put_signals = [signal for signal in signals if signal.verb == 'PUT']
+    latest_get = max(get_signals, key=lambda signal: signal.timestamp, default=None)
+    latest_put = max(put_signals, key=lambda signal: signal.timestamp, default=None)
+
+    with transaction.atomic():
+        summary, _ = TerminalSignalSummary.objects.select_for_update().get_or_create(terminal=terminal)
+        if latest_get and (summary.last_get_timestamp is None or latest_get.timestamp > summary.last_get_timestamp):
+            summary.last_get_timestamp = latest_get.timestamp
+            summary.last_get_message = latest_get.message
+        if latest_put and (summary.last_put_timestamp is None or latest_put.timestamp > summary.last_put_timestamp):
+            summary.last_put_timestamp = latest_put.timestamp
+            summary.last_put_message = latest_put.message
+        summary.signal_count += len(signals)
+        summary.get_count += len(get_signals)
+        summary.put_count += len(put_signals)
+        summary.save()
+    return summary
+
+
+def rebuild_signal_summary(terminal):
+    """Recompute a terminal's TerminalSignalSummary from the stored Signal rows."""
+    signals = Signal.objects.filter(terminal=terminal)
+    get_signals = signals.filter(verb='GET')
+    put_signals = signals.filter(verb='PUT')
+    latest_get = get_signals.order_by('-timestamp').values('timestamp', 'message').first() or {}
+    latest_put = put_signals.order_by('-timestamp').values('timestamp', 'message').first() or {}
+
+    summary, _ = TerminalSignalSummary.objects.update_or_create(
+        terminal=terminal,
+        defaults={
+            'last_get_timestamp': latest_get.get('timestamp'),
+            'last_get_message': latest_get.get('message'),
+            'last_put_timestamp': latest_put.get('timestamp'),
+            'last_put_message': latest_put.get('message'),
+            'signal_count': signals.count(),
+            'get_count': get_signals.count(),
+            'put_count': put_signals.count(),
+        }
+    )
+    return summary
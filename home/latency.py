@@ -0,0 +1,139 @@
+# home/latency.py
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import SignalLatencyHistogram
+
+# Upper bounds (ms) of the histogram buckets, each 15% wider than the previous one (5 ms to ~29 s);
+# the last bucket takes everything slower. Stored counts depend on these, so never change them.
+LATENCY_BUCKET_BOUNDS = [round(5 * 1.15 ** i) for i in range(63)]
+BUCKET_COUNT = len(LATENCY_BUCKET_BOUNDS) + 1
+DEFAULT_PERCENTILES = (50, 95, 99)
+
+
+def floor_to(value, resolution):
+    value = value.replace(second=0, microsecond=0)
+    return value.replace(minute=0) if resolution == 'hour' else value
+
+
+def record_latencies(terminal, signals):
+    """
+    Fold the roundtrip times of newly ingested TX signals into the minute and hour histograms.
+
+    Called from home.ingest inside the ingest transaction.
+    """
+    groups = defaultdict(list)
+    for signal in signals:
+        if signal.roundtrip_ms is None or not signal.verb:
+            continue
+        timestamp = signal.timestamp.astimezone(dt_timezone.utc)
+        for resolution in ('minute', 'hour'):
+            groups[(signal.verb, resolution, floor_to(timestamp, resolution))].append(signal.roundtrip_ms)
+    if not groups:
+        return
+
+    key_filter = Q()
+    for verb, resolution, bucket_start in groups:
+        key_filter |= Q(verb=verb, resolution=resolution, bucket_start=bucket_start)
+
+    with transaction.atomic():
+        existing = {
+            (histogram.verb, histogram.resolution, histogram.bucket_start): histogram
+            for histogram in SignalLatencyHistogram.objects.select_for_update().filter(key_filter, terminal=terminal)
+        }
+
+        histograms = []
+        for key, durations in groups.items():
+            durations = np.asarray(durations)
+            counts = np.bincount(np.searchsorted(LATENCY_BUCKET_BOUNDS, durations, side='left'), minlength=BUCKET_COUNT)
+            histogram = existing.get(key) or SignalLatencyHistogram(
+                terminal=terminal, verb=key[0], resolution=key[1], bucket_start=key[2],
+                counts=[0] * BUCKET_COUNT, count=0, total_ms=0, max_ms=0,
+            )
+            histogram.counts = (np.asarray(histogram.counts) + counts).tolist()
+            histogram.count += len(durations)
+            histogram.total_ms += int(durations.sum())
+            histogram.max_ms = max(histogram.max_ms, int(durations.max()))
+            histograms.append(histogram)
+
+        SignalLatencyHistogram.objects.bulk_create(
+            histograms,
+            update_conflicts=True,
+            unique_fields=['terminal', 'verb', 'resolution', 'bucket_start'],
+            update_fields=['counts', 'count', 'total_ms', 'max_ms'],
+        )
+
+
+def histogram_percentile(counts, percentile, max_ms):
+    """Estimate a percentile from bucket counts, interpolating linearly inside the bucket."""
+    total = counts.sum()
+    if not total:
+        return None
+    rank = percentile / 100 * total
+    cumulative = np.cumsum(counts)
+    index = int(np.searchsorted(cumulative, rank, side='left'))
+    lower = LATENCY_BUCKET_BOUNDS[index - 1] if index > 0 else 0
+    upper = LATENCY_BUCKET_BOUNDS[index] if index < len(LATENCY_BUCKET_BOUNDS) else max(max_ms, lower)
+    upper = min(upper, max_ms)
+    below = cumulative[index - 1] if index > 0 else 0
+    fraction = (rank - below) / counts[index] if counts[index] else 0
+    return round(float(lower + (upper - lower) * fraction), 1)
+
+
+def latency_percentiles(terminal, start, end, verb=None, percentiles=DEFAULT_PERCENTILES):
+    """
+    Return roundtrip statistics per verb for a terminal between `start` and `end`.
+
+    Whole hours inside the window are read from the hour histograms and the ragged edges
+    from the minute histograms, so a shift-long window reads a few dozen rows. Returns
+    `{verb: {'count', 'mean_ms', 'max_ms', 'p50', ...}}`.
+    """
+    first_hour = floor_to(start, 'hour')
+    if first_hour < start:
+        first_hour += timedelta(hours=1)
+    last_hour = floor_to(end, 'hour')
+
+    if first_hour < last_hour:
+        window = (
+            Q(resolution='hour', bucket_start__gte=first_hour, bucket_start__lt=last_hour)
+            | Q(resolution='minute', bucket_start__gte=start, bucket_start__lt=first_hour)
+            | Q(resolution='minute', bucket_start__gte=last_hour, bucket_start__lt=end)
+        )
+    else:
+        window = Q(resolution='minute', bucket_start__gte=start, bucket_start__lt=end)
+
+    histograms = SignalLatencyHistogram.objects.filter(window, terminal=terminal)
+    if verb:
+        histograms = histograms.filter(verb=verb)
+
+    totals = {}
+    for verb_name, counts, count, total_ms, max_ms in histograms.values_list('verb', 'counts', 'count', 'total_ms', 'max_ms'):
+        total = totals.setdefault(verb_name, {'counts': np.zeros(BUCKET_COUNT, dtype=np.int64), 'count': 0, 'total_ms': 0, 'max_ms': 0})
+        total['counts'] += counts
+        total['count'] += count
+        total['total_ms'] += total_ms
+        total['max_ms'] = max(total['max_ms'], max_ms)
+
+    stats = {}
+    for verb_name, total in sorted(totals.items()):
+        stats[verb_name] = {
+            'count': total['count'],
+            'mean_ms': round(total['total_ms'] / total['count'], 1) if total['count'] else None,
+            'max_ms': total['max_ms'],
+        }
+        for percentile in percentiles:
+            stats[verb_name][f'p{percentile:g}'] = histogram_percentile(total['counts'], percentile, total['max_ms'])
+    return stats
+
+
+def prune_latency_histograms(now=None):
+    """Delete minute histograms older than LATENCY_MINUTE_RETENTION_DAYS; hour histograms are kept."""
+    cutoff = (now or timezone.now()) - timedelta(days=settings.LATENCY_MINUTE_RETENTION_DAYS)
+    deleted, _ = SignalLatencyHistogram.objects.filter(resolution='minute', bucket_start__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,149 @@
+# home/limits.py
+import logging
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .emails import queue_signal_limit_email
+from .models import ClientToken, Notification, NotificationStatus, SignalLimit
+from .outbox import enqueue_notification
+
+logger = logging.getLogger('home')
+
+
+def normalize_signal_key(signal_key):
+    # Limits are entered the way keys appear in the payload (@Temperatura); measurements are stored without the @
+    return signal_key.strip().lstrip('@').strip()
+
+
+class LimitIndex:
+    """
+    The active SignalLimits, held in memory as one small DataFrame per terminal.
+
+    The index is reloaded from the database once it is older than `ttl` seconds, and is
+    dropped immediately when a limit is saved or deleted in this process (see home.signals).
+    Checking a batch is a single merge on the signal key plus a vectorized comparison;
+    terminals without limits return before any pandas work is done.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = settings.SIGNAL_LIMIT_CACHE_TTL if ttl is None else ttl
+        self._by_terminal = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._by_terminal = None
+
+    def _load(self):
+        rows = SignalLimit.objects.filter(is_active=True).values_list('id', 'terminal_id', 'signal_key', 'limit_value')
+        frame = pd.DataFrame(list(rows), columns=['limit_id', 'terminal_id', 'signal_key', 'limit_value'])
+        frame['signal_key'] = frame['signal_key'].map(normalize_signal_key)
+        return {
+            int(terminal_id): limits.drop(columns='terminal_id').reset_index(drop=True)
+            for terminal_id, limits in frame.groupby('terminal_id')
+        }
+
+    def limits_for(self, terminal_id):
+        """Return the active limits of a terminal as a DataFrame, or None if it has none."""
+        with self._lock:
+            if self._by_terminal is None or time.monotonic() - self._loaded_at > self.ttl:
+                self._by_terminal = self._load()
+                self._loaded_at = time.monotonic()
+            return self._by_terminal.get(terminal_id)
+
+    def check(self, terminal_id, measurements):
+        """
+        Compare a batch of SignalMeasurement objects of one terminal with its limits.
+
+        Returns None when nothing is over a limit, otherwise a DataFrame with one row per
+        crossed limit: limit_id, signal_key, limit_value and the highest `value` in the batch
+        with its `timestamp`.
+        """
+        limits = self.limits_for(terminal_id)
+        if limits is None or not measurements:
+            return None
+
+        batch = pd.DataFrame({
+            'signal_key': [measurement.signal_key for measurement in measurements],
+            'value': np.fromiter((measurement.value for measurement in measurements), dtype=float, count=len(measurements)),
+            'timestamp': [measurement.timestamp for measurement in measurements],
+        })
+        crossed = batch.merge(limits, on='signal_key')
+        crossed = crossed[crossed['value'].to_numpy() > crossed['limit_value'].to_numpy()]
+        if crossed.empty:
+            return None
+        return crossed.loc[crossed.groupby('limit_id')['value'].idxmax()]
+
+
+# One index per process; the poller keeps it warm between sweeps
+limit_index = LimitIndex()
+
+
+def evaluate_limits(terminal, measurements):
+    """
+    Check freshly ingested measurements against the terminal's limits and send the alerts.
+
+    An alert goes out at most once per SIGNAL_LIMIT_ALERT_COOLDOWN seconds per limit; the
+    cooldown is claimed with a conditional UPDATE, so overlapping polls cannot both send it.
+    Returns the limits that were alerted.
+    """
+    crossed = limit_index.check(terminal.pk, measurements)
+    if crossed is None:
+        return []
+
+    now = timezone.now()
+    cooldown_start = now - timedelta(seconds=settings.SIGNAL_LIMIT_ALERT_COOLDOWN)
+    claimed = {}
+    for row in crossed.itertuples(index=False):
+        updated = SignalLimit.objects.filter(pk=row.limit_id, is_active=True).filter(
+            Q(last_triggered_at__isnull=True) | Q(last_triggered_at__lt=cooldown_start)
+        ).update(last_triggered_at=now)
+        if updated:
+            claimed[int(row.limit_id)] = (row.value, row.timestamp)
+
+    limits = SignalLimit.objects.select_related('user', 'terminal').in_bulk(list(claimed))
+    for limit_id, (value, timestamp) in claimed.items():
+        send_limit_alert(limits[limit_id], value, timestamp)
+    return list(limits.values())
+
+
+def send_limit_alert(limit, value, timestamp):
+    """Notify the owner of a limit in the app and by email, both through the outboxes. Email failures are logged, not raised."""
+    key = f"Meja {limit.signal_key}"[:100]
+    content = (
+        f"{limit.terminal}: {limit.signal_key} = {value:g} presega mejo {limit.limit_value:g} "
+        f"({timezone.localtime(timestamp):%d.%m.%Y %H:%M:%S})."
+    )
+
+    if limit.user:
+        token = ClientToken.objects.filter(
+            user=limit.user,
+            expires_at__gt=timezone.now()
+        ).order_by('-created_at').first()
+        with transaction.atomic():
+            notification = Notification.objects.create(
+                key=key,
+                sender_user=limit.user,
+                receiver_user=limit.user,
+                receiver_token=token,
+                notification_content=content,
+            )
+            NotificationStatus.objects.create(notification=notification, status='sent')
+            if token:
+                enqueue_notification(notification)
+
+    email = limit.notification_email or (limit.user.email if limit.user else None)
+    if email:
+        try:
+            queue_signal_limit_email(email, subject=f"Opozorilo: {key}", message_content=content, recipient=limit.user)
+        except Exception as e:
+            logger.error(f"Error queueing limit alert {limit.pk} to {email}: {e}")
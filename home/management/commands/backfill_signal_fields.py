@@ -0,0 +1,39 @@
+# home/management/commands/backfill_signal_fields.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from home.models import Signal
+from utils.parsers import parse_signal_message
+
+STRUCTURED_FIELDS = ['direction', 'verb', 'station_code', 'operation_code', 'dmc', 'ack_result', 'roundtrip_ms']
+
+class Command(BaseCommand):
+    help = "Parse the message of Signal rows stored before structured columns existed, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows parsed and updated per transaction.")
+        parser.add_argument('--all', action='store_true', help="Re-parse every row, not only rows without a direction.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        signals = Signal.objects.all() if options['all'] else Signal.objects.filter(direction__isnull=True)
+
+        last_pk = 0
+        updated = 0
+        while True:
+            # Keyset pagination on pk, so rows that stay unparseable are not selected again
+            batch = list(signals.filter(pk__gt=last_pk).order_by('pk').only('pk', 'message')[:batch_size])
+            if not batch:
+                break
+
+            for signal in batch:
+                for field, value in parse_signal_message(signal.message).items():
+                    setattr(signal, field, value)
+
+            with transaction.atomic():
+                Signal.objects.bulk_update(batch, STRUCTURED_FIELDS)
+
+            last_pk = batch[-1].pk
+            updated += len(batch)
+            self.stdout.write(f"Parsed {updated} signals (up to id {last_pk})")
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled structured columns for {updated} signals."))
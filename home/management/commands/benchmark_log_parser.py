@@ -0,0 +1,76 @@
+# home/management/commands/benchmark_log_parser.py
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from utils.parsers import LogParser
+
+# Rows in the same shape as a roboservice log page, used when no recorded pages are given
+SAMPLE_MESSAGES = [
+    ("INFO", "TX (183 ms): PUT|20|40|520022331003006847+00130070F03Z2004EW|DMC;@Kvaliteta;@Temperatura;25.00@Tesnost zrak;1.620@Tesnost helij;0.00077@Prebitost;1.00 => ACK"),
+    ("INFO", "RX: PUT|20|40|520022331003006847+00130070F03Z2004EW|DMC;@Kvaliteta;@Temperatura;25.00@Tesnost zrak;1.620@Tesnost helij;0.00077@Prebitost;1.00"),
+    ("INFO", "TX (199 ms): GET|20|520022331003006569+00130070F03Z2004EW => 20|40| 0|OK| | 90|1| 40| TMB22| 20| 0| 025463301| | ( )|"),
+    ("INFO", "RX: GET|20|520022331003006569+00130070F03Z2004EW"),
+]
+
+
+def build_synthetic_page(row_count):
+    newest = datetime(2024, 9, 25, 9, 44, 37, 866000)
+    rows = []
+    for i in range(row_count):
+        label, message = SAMPLE_MESSAGES[i % len(SAMPLE_MESSAGES)]
+        timestamp = (newest - timedelta(seconds=7 * i)).strftime('%d.%m.%Y %H:%M:%S.%f')[:-3]
+        message = message.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+        rows.append(f"<tr><td>{label}</td><td>{timestamp}</td><td>{message}</td></tr>")
+    return "<html><body><table><tr><th>Level</th><th>Time</th><th>Message</th></tr>" + "".join(rows) + "</table></body></html>"
+
+
+class Command(BaseCommand):
+    help = "Compare the streaming and BeautifulSoup LogParser modes on recorded roboservice log pages."
+
+    def add_arguments(self, parser):
+        parser.add_argument('pages', nargs='*', help="Recorded roboservice log pages (HTML files).")
+        parser.add_argument('--rows', type=int, default=5000, help="Rows in the synthetic page used when no pages are given.")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per parser and page; the best time is reported.")
+        parser.add_argument('--first-get-and-put', action='store_true', help="Benchmark with the early exit used by poll_terminals.")
+
+    def handle(self, *args, **options):
+        if options['pages']:
+            pages = []
+            for path in options['pages']:
+                try:
+                    pages.append((path, Path(path).read_text(encoding='utf-8', errors='replace')))
+                except OSError as e:
+                    raise CommandError(f"Cannot read {path}: {e}")
+        else:
+            pages = [(f"synthetic ({options['rows']} rows)", build_synthetic_page(options['rows']))]
+
+        parse_first_get_and_put = options['first_get_and_put']
+        parsers = {
+            'soup': LogParser(streaming=False),
+            'streaming': LogParser(streaming=True),
+        }
+
+        for name, html_content in pages:
+            results = {}
+            timings = {}
+            for mode, log_parser in parsers.items():
+                best = None
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    results[mode] = log_parser.parse_html_logs(html_content, parse_first_get_and_put=parse_first_get_and_put)
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                timings[mode] = best
+
+            if results['soup'] != results['streaming']:
+                self.stdout.write(self.style.ERROR(f"{name}: parsers returned different rows"))
+                continue
+
+            speedup = timings['soup'] / timings['streaming'] if timings['streaming'] else float('inf')
+            self.stdout.write(
+                f"{name}: {len(results['streaming'])} rows, "
+                f"soup {timings['soup'] * 1000:.1f} ms, streaming {timings['streaming'] * 1000:.1f} ms "
+                f"({speedup:.1f}x)"
+            )
@@ -1,38 +1,59 @@
-# import threading
-# from django.core.management.base import BaseCommand
-# from django.utils import timezone
-# from datetime import timedelta
-# from home.models import OnlineUser
-
-# class Command(BaseCommand):
-#     help = 'Checks for terminals that have gone offline every 3 minutes'
-
-#     def handle(self, *args, **options):
-#         # Use an event for more efficient timing control
-#         stop_event = threading.Event()
-
-#         def check_offline_terminals():
-#             while not stop_event.wait(timeout=180):  # 180 seconds = 3 minutes
-#                 timeout = timezone.now() - timedelta(minutes=2)
-#                 offline_terminals = OnlineUser.objects.filter(
-#                     is_terminal=True,
-#                     last_seen__lt=timeout,
-#                     sign_out_time__isnull=True
-#                 )
-#                 for terminal in offline_terminals:
-#                     terminal.sign_out_time = timezone.now()
-#                     terminal.save()
-#                     print(f"Terminal {terminal.terminal.terminal_hostname} marked as offline.")
-
-#         # Start the loop in a separate thread to allow for smooth execution
-#         check_thread = threading.Thread(target=check_offline_terminals, daemon=True)
-#         check_thread.start()
-
-#         # Keep the main thread running, waiting for a manual stop (CTRL+C or stop command)
-#         try:
-#             while check_thread.is_alive():
-#                 check_thread.join(1)  # Keep the main thread alive
-#         except KeyboardInterrupt:
-#             print("Stopping offline terminal check...")
-#             stop_event.set()
-#             check_thread.join()
+# home/management/commands/check_offline_terminals.py
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from home.presence import publish_presence_change, sweep_offline_terminals
+
+
+class Command(BaseCommand):
+    help = "Sign out terminals that stopped sending heartbeats and publish one presence event for them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timeout', type=float, default=settings.OFFLINE_TERMINAL_TIMEOUT,
+                            help="Seconds without a heartbeat after which a terminal is offline.")
+        parser.add_argument('--interval', type=float, default=settings.OFFLINE_TERMINAL_SWEEP_INTERVAL,
+                            help="Seconds between sweeps.")
+        parser.add_argument('--once', action='store_true', help="Sweep once and exit (e.g. from cron).")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("The offline sweep is only supported on PostgreSQL.")
+
+        stop = threading.Event()
+        if not options['once']:
+            def request_stop(signum, frame):
+                self.stdout.write(f"Received signal {signum}, stopping.")
+                stop.set()
+
+            signal.signal(signal.SIGTERM, request_stop)
+            signal.signal(signal.SIGINT, request_stop)
+
+        while not stop.is_set():
+            close_old_connections()
+            self.sweep(options['timeout'])
+            if options['once']:
+                break
+            stop.wait(options['interval'])
+
+    def sweep(self, timeout):
+        now = timezone.now()
+        try:
+            swept = sweep_offline_terminals(timeout, now)
+        except Exception as e:
+            self.stderr.write(f"Error sweeping offline terminals: {e}")
+            return
+        if not swept:
+            return
+
+        self.stdout.write(f"{len(swept)} terminals marked as offline: "
+                          + ", ".join(str(terminal['terminal_hostname']) for terminal in swept))
+        try:
+            publish_presence_change('terminals_offline', swept, now)
+        except Exception as e:
+            # The sessions are signed out either way; only the event is lost
+            self.stderr.write(f"Error publishing presence change: {e}")
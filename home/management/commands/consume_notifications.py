@@ -3,15 +3,31 @@ import logging
 import pika
 from django.core.management.base import BaseCommand
 from django.conf import settings
+from django.db import close_old_connections, transaction
 from django.utils import timezone
-from home.models import Notification, NotificationStatus
-from utils.utils import send_response_email
+from home.models import EmailOutbox, Notification, NotificationStatus
+from home.emails import build_response_email
+from home.status_feed import publish_status_events, status_event
+
+STATUS_VALUES = {value for value, label in NotificationStatus._meta.get_field('status').choices}
 
 class Command(BaseCommand):
     help = 'Consume notification responses from RabbitMQ'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--prefetch', type=int, default=settings.NOTIFICATION_CONSUMER_PREFETCH,
+                            help="Unacknowledged messages RabbitMQ may deliver ahead of processing.")
+        parser.add_argument('--batch-size', type=int, default=settings.NOTIFICATION_CONSUMER_BATCH_SIZE,
+                            help="Messages applied to the database in one transaction; 1 processes them one by one.")
+        parser.add_argument('--batch-window', type=float, default=settings.NOTIFICATION_CONSUMER_BATCH_WINDOW,
+                            help="Seconds to wait for a batch to fill before applying it.")
+
     def handle(self, *args, **options):
-        consumer = NotificationConsumer()
+        consumer = NotificationConsumer(
+            prefetch=options['prefetch'],
+            batch_size=options['batch_size'],
+            batch_window=options['batch_window'],
+        )
         try:
             consumer.run()
         except KeyboardInterrupt:
@@ -20,7 +36,21 @@ class Command(BaseCommand):
             logging.exception("An unexpected error occurred.")
 
 class NotificationConsumer:
-    def __init__(self):
+    """
+    Applies the status updates terminals send back for notifications.
+
+    Messages are buffered until `batch_size` have arrived or `batch_window` seconds passed since
+    the first one, then applied in a single transaction and acknowledged with one multiple-ack.
+    A message that cannot be parsed or applied on its own is logged with its body and rejected
+    to the `notifications_responses.dead` queue, where it stays for inspection or replay.
+    """
+
+    def __init__(self, prefetch=100, batch_size=50, batch_window=0.2):
+        self._prefetch = max(prefetch, batch_size)
+        self._batch_size = max(batch_size, 1)
+        self._batch_window = batch_window
+        self._batch = []  # (delivery_tag, body) not yet applied
+        self._flush_timer = None
         self._connection = None
         self._channel = None
         self._closing = False
@@ -28,6 +58,8 @@ class NotificationConsumer:
         self._url = self._get_connection_parameters()
         self._exchange = 'notifications_responses'
         self._exchange_type = 'direct'
+        self._dead_letter_exchange = 'notifications_responses.dead'
+        self._dead_letter_queue = 'notifications_responses.dead'
         self._queue = None
         self._routing_key = 'django_server'
         self._reconnect_delay = 5  # Initial delay for reconnection attempts
@@ -71,6 +103,9 @@ class NotificationConsumer:
     def _on_connection_closed(self, connection, reason):
         """Callback when the connection to RabbitMQ is closed."""
         self._channel = None
+        # Unacknowledged deliveries died with the channel; their tags cannot be acked any more
+        self._batch = []
+        self._flush_timer = None
         if self._closing:
             self._connection.ioloop.stop()
         else:
@@ -117,6 +152,37 @@ class NotificationConsumer:
     def _on_exchange_declareok(self, unused_frame):
         """Callback when the exchange is declared."""
         logging.info('Exchange declared')
+        self._setup_dead_letter_exchange()
+
+    def _setup_dead_letter_exchange(self):
+        """Declare the exchange rejected messages are dead-lettered to."""
+        logging.info('Declaring dead-letter exchange %s', self._dead_letter_exchange)
+        self._channel.exchange_declare(
+            exchange=self._dead_letter_exchange,
+            exchange_type='fanout',
+            durable=True,
+            callback=self._on_dead_letter_exchange_declareok
+        )
+
+    def _on_dead_letter_exchange_declareok(self, unused_frame):
+        """Callback when the dead-letter exchange is declared."""
+        self._channel.queue_declare(
+            queue=self._dead_letter_queue,
+            durable=True,
+            callback=self._on_dead_letter_queue_declareok
+        )
+
+    def _on_dead_letter_queue_declareok(self, method_frame):
+        """Callback when the dead-letter queue is declared."""
+        self._channel.queue_bind(
+            queue=self._dead_letter_queue,
+            exchange=self._dead_letter_exchange,
+            callback=self._on_dead_letter_bindok
+        )
+
+    def _on_dead_letter_bindok(self, unused_frame):
+        """Callback when the dead-letter queue is bound."""
+        logging.info('Dead-letter queue %s bound', self._dead_letter_queue)
         self._setup_queue()
 
     def _setup_queue(self):
@@ -125,6 +191,7 @@ class NotificationConsumer:
         self._channel.queue_declare(
             queue='',  # Let RabbitMQ generate a unique queue name
             exclusive=True,
+            arguments={'x-dead-letter-exchange': self._dead_letter_exchange},
             callback=self._on_queue_declareok
         )
 
@@ -142,6 +209,11 @@ class NotificationConsumer:
     def _on_bindok(self, unused_frame):
         """Callback when the queue is bound to the exchange."""
         logging.info('Queue bound')
+        self._channel.basic_qos(prefetch_count=self._prefetch, callback=self._on_basic_qos_ok)
+
+    def _on_basic_qos_ok(self, unused_frame):
+        """Callback when the prefetch limit is set."""
+        logging.info('QOS set to: %d', self._prefetch)
         self._start_consuming()
 
     def _start_consuming(self):
@@ -167,57 +239,151 @@ class NotificationConsumer:
     def _on_message(self, ch, method, properties, body):
         """Callback when a message is received."""
         logging.info('Received message # %s: %s', method.delivery_tag, body)
-        try:
-            message = json.loads(body)
-            notification_id = message.get('notification_id')
-            user_response = message.get('user_response', None)
-            status = message.get('status')
+        self._batch.append((method.delivery_tag, body))
+        if len(self._batch) >= self._batch_size:
+            self._flush()
+        elif self._flush_timer is None:
+            self._flush_timer = self._connection.ioloop.call_later(self._batch_window, self._flush)
+
+    def _flush(self):
+        """Apply the buffered messages, dead-letter the ones that failed and ack the rest with one multiple-ack."""
+        if self._flush_timer is not None:
+            self._connection.ioloop.remove_timeout(self._flush_timer)
+            self._flush_timer = None
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
 
-            self.update_notification_status(notification_id, status, user_response)
+        updates = []  # (delivery_tag, body, update)
+        failed = []  # (delivery_tag, body, error)
+        for delivery_tag, body in batch:
+            try:
+                message = json.loads(body)
+                updates.append((delivery_tag, body, (message.get('notification_id'), message.get('status'), message.get('user_response', None))))
+            except Exception as e:
+                failed.append((delivery_tag, body, e))
+
+        # The consumer runs for days; drop database connections that went away meanwhile
+        close_old_connections()
+        try:
+            self.update_notification_statuses([update for _, _, update in updates])
         except Exception as e:
-            logging.error(f"Error processing message: {e}")
-        finally:
-            ch.basic_ack(delivery_tag=method.delivery_tag)
+            logging.error(f"Error applying {len(updates)} status updates at once, applying them one by one: {e}")
+            for delivery_tag, body, update in updates:
+                try:
+                    self.update_notification_statuses([update])
+                except Exception as e:
+                    failed.append((delivery_tag, body, e))
+
+        self._settle(batch, failed)
+
+    def _settle(self, batch, failed):
+        """Reject the `failed` messages of `batch` to the dead-letter queue and ack all the others at once."""
+        for delivery_tag, body, error in failed:
+            logging.error(f"Dead-lettering message # {delivery_tag} after {error!r}: {body!r}")
+        if not (self._channel and self._channel.is_open):
+            # Unacknowledged deliveries died with the channel; their tags cannot be settled any more
+            return
+
+        failed_tags = {delivery_tag for delivery_tag, body, error in failed}
+        for delivery_tag in sorted(failed_tags):
+            self._channel.basic_nack(delivery_tag=delivery_tag, requeue=False)
+        applied_tags = [delivery_tag for delivery_tag, body in batch if delivery_tag not in failed_tags]
+        if applied_tags:
+            # Acks everything up to the newest applied tag; the rejected ones in between are already settled
+            self._channel.basic_ack(delivery_tag=max(applied_tags), multiple=True)
 
     def update_notification_status(self, notification_id, status, user_response=None):
-        """Update the notification status in the database."""
+        """Update the status of a single notification in the database."""
+        self.update_notification_statuses([(notification_id, status, user_response)])
+
+    def update_notification_statuses(self, updates):
+        """
+        Apply `(notification_id, status, user_response)` updates in one transaction.
+
+        Notifications and statuses are loaded with one query each and written back with
+        bulk_create/bulk_update. Updates for the same notification are applied in order.
+        """
+        updates = [update for update in map(self._clean_update, updates) if update]
+        if not updates:
+            return
+
+        notification_ids = {notification_id for notification_id, status, user_response in updates}
+        now = timezone.now()
+        changed_notifications = {}
+        replied = {}
+        changed_statuses = {}  # notification id -> (notification, status), for the live pages
+        with transaction.atomic():
+            notifications = Notification.objects.select_related(
+                'sender_user', 'receiver_user__obrat_oddelek', 'receiver_terminal',
+            ).prefetch_related('receiver_terminal__terminal_machines').in_bulk(notification_ids)
+            statuses = {
+                notification_status.notification_id: notification_status
+                for notification_status in NotificationStatus.objects.filter(notification_id__in=list(notifications))
+            }
+            new_statuses = {}
+
+            for notification_id, status, user_response in updates:
+                notification = notifications.get(notification_id)
+                if notification is None:
+                    logging.error(f"Notification {notification_id} does not exist.")
+                    continue
+
+                notification_status = statuses.get(notification.id)
+                if notification_status is None:
+                    notification_status = new_statuses.setdefault(notification.id, NotificationStatus(notification=notification))
+                notification_status.status = status
+                notification_status.updated_at = now
+                changed_statuses[notification.id] = (notification, status)
+
+                if status == 'replied' and user_response is not None:
+                    notification.reply_content = user_response
+                    notification.time_replied = now
+                    notification.receiver_notified = True
+                    changed_notifications[notification.id] = notification
+                    if notification.notify_response_email:
+                        replied[notification.id] = notification
+                elif status == 'read':
+                    notification.receiver_notified = True
+                    changed_notifications[notification.id] = notification
+                elif status == 'delivered':
+                    # Update any additional fields if necessary
+                    pass
+
+                logging.info(f"Notification {notification_id} status updated to '{status}'.")
+
+            NotificationStatus.objects.bulk_create(new_statuses.values())
+            NotificationStatus.objects.bulk_update(statuses.values(), ['status', 'updated_at'])
+            Notification.objects.bulk_update(
+                changed_notifications.values(),
+                ['reply_content', 'time_replied', 'receiver_notified'],
+            )
+
+            # Response emails are queued with the replies and sent by send_queued_emails
+            emails = [build_response_email(notification) for notification in replied.values()]
+            EmailOutbox.objects.bulk_create([email for email in emails if email])
+
+            # Pushed to open notification pages through home.status_feed once the changes are visible
+            events = [status_event(notification, status, now) for notification, status in changed_statuses.values()]
+            transaction.on_commit(lambda: publish_status_events(events))
+
+    def _clean_update(self, update):
+        notification_id, status, user_response = update
         try:
-            notification = Notification.objects.get(id=notification_id)
-            notification_status, created = NotificationStatus.objects.get_or_create(notification=notification)
-            notification_status.status = status
-            notification_status.save()
-
-            if status == 'replied' and user_response is not None:
-                notification.reply_content = user_response
-                notification.time_replied = timezone.now()
-                notification.receiver_notified = True
-                notification.save()
-
-                # Handle sending response email if needed
-                if notification.notify_response_email:
-                    try:
-                        send_response_email(notification)
-                        logging.info(f"Response email sent for notification {notification_id}.")
-                    except Exception as e:
-                        logging.error(f"Failed to send response email for notification {notification_id}: {e}")
-            elif status == 'read':
-                notification.receiver_notified = True
-                notification.save()
-            elif status == 'delivered':
-                # Update any additional fields if necessary
-                pass
-
-            logging.info(f"Notification {notification_id} status updated to '{status}'.")
-
-        except Notification.DoesNotExist:
-            logging.error(f"Notification {notification_id} does not exist.")
-        except Exception as e:
-            logging.error(f"Error updating notification status: {e}")
+            notification_id = int(notification_id)
+        except (TypeError, ValueError):
+            logging.error(f"Message with invalid notification_id {notification_id!r} ignored.")
+            return None
+        if status not in STATUS_VALUES:
+            logging.error(f"Unknown status {status!r} for notification {notification_id} ignored.")
+            return None
+        return notification_id, status, user_response
 
     def stop(self):
         """Stop the consumer gracefully."""
         logging.info('Stopping')
         self._closing = True
+        self._flush()
         if self._channel:
             self._channel.basic_cancel(self._consumer_tag, callback=self._on_cancelok)
         else:
@@ -0,0 +1,29 @@
+# home/management/commands/dispatch_notifications.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from home.outbox import dispatch_outbox, purge_sent_outbox, run_outbox_worker
+
+
+class Command(BaseCommand):
+    help = "Publish queued notifications from the outbox to RabbitMQ, retrying with backoff while the broker is unavailable."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.NOTIFICATION_OUTBOX_BATCH_SIZE,
+                            help="Messages published per batch.")
+        parser.add_argument('--interval', type=float, default=settings.NOTIFICATION_OUTBOX_POLL_INTERVAL,
+                            help="Seconds to wait when the outbox is empty.")
+        parser.add_argument('--max-attempts', type=int, default=settings.NOTIFICATION_OUTBOX_MAX_ATTEMPTS,
+                            help="Attempts before a message is marked failed.")
+        parser.add_argument('--once', action='store_true', help="Publish everything that is due and exit.")
+
+    def handle(self, *args, **options):
+        run_outbox_worker(
+            self,
+            "Notification dispatcher",
+            lambda: dispatch_outbox(options['batch_size'], options['max_attempts']),
+            purge_sent_outbox,
+            options['batch_size'],
+            options['interval'],
+            options['once'],
+        )
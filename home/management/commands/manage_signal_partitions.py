@@ -0,0 +1,52 @@
+# home/management/commands/manage_signal_partitions.py
+import argparse
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from home.latency import prune_latency_histograms
+from home.partitions import ensure_signal_partitions, prune_signal_partitions
+
+
+class Command(BaseCommand):
+    help = ("Create upcoming monthly Signal partitions, drop or archive the ones past the retention window "
+            "and prune old minute latency histograms.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=settings.SIGNAL_PARTITION_MONTHS_AHEAD,
+                            help="Months ahead of the current one to create partitions for.")
+        parser.add_argument('--retention-months', type=int, default=settings.SIGNAL_RETENTION_MONTHS,
+                            help="Full months of signals to keep besides the current one; 0 keeps everything.")
+        parser.add_argument('--archive', action=argparse.BooleanOptionalAction, default=settings.SIGNAL_ARCHIVE_EXPIRED,
+                            help="Keep expired partitions as archive_* tables instead of dropping them "
+                                 "(default from SIGNAL_ARCHIVE_EXPIRED; --no-archive drops them).")
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be pruned.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Signal partitions are only supported on PostgreSQL.")
+
+        if options['dry_run']:
+            self.stdout.write("Dry run: no partitions are created.")
+        else:
+            for name in ensure_signal_partitions(options['ahead']):
+                self.stdout.write(f"Created partition {name}")
+
+        if options['retention_months'] > 0:
+            expired = prune_signal_partitions(
+                options['retention_months'],
+                archive=options['archive'],
+                dry_run=options['dry_run'],
+            )
+            action = 'Archived' if options['archive'] else 'Dropped'
+            if options['dry_run']:
+                action = f"Would have {action.lower()}"
+            for name in expired:
+                self.stdout.write(f"{action} partition {name}")
+
+        if not options['dry_run']:
+            deleted = prune_latency_histograms()
+            self.stdout.write(f"Deleted {deleted} minute latency histograms")
+
+        self.stdout.write(self.style.SUCCESS("Signal partitions are up to date."))
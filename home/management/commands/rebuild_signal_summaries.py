@@ -0,0 +1,22 @@
+# home/management/commands/rebuild_signal_summaries.py
+from django.core.management.base import BaseCommand
+from home.ingest import rebuild_signal_summary
+from home.models import Terminal
+
+class Command(BaseCommand):
+    help = "Recompute TerminalSignalSummary rows from the stored Signal table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--terminal', action='append', dest='hostnames', help="Terminal hostname to rebuild (repeatable). Defaults to all terminals.")
+
+    def handle(self, *args, **options):
+        terminals = Terminal.objects.all()
+        if options['hostnames']:
+            terminals = terminals.filter(terminal_hostname__in=options['hostnames'])
+
+        rebuilt = 0
+        for terminal in terminals.iterator():
+            rebuild_signal_summary(terminal)
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt signal summaries for {rebuilt} terminals."))
@@ -0,0 +1,41 @@
+# home/management/commands/reconcile_token_queues.py
+from django.core.management.base import BaseCommand, CommandError
+
+from home.tokens import live_tokens, parse_token
+from utils.rabbitmq import TOKEN_QUEUE_PREFIX, get_publisher, list_queues
+
+
+class Command(BaseCommand):
+    help = "Delete RabbitMQ token queues whose ClientToken no longer exists or has expired."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report the orphaned queues.")
+
+    def handle(self, *args, **options):
+        try:
+            queues = list_queues()
+        except Exception as e:
+            raise CommandError(f"Cannot list RabbitMQ queues: {e}")
+
+        # queue name -> token, for the queues that look like token queues
+        token_queues = {}
+        for queue in queues:
+            if queue.startswith(TOKEN_QUEUE_PREFIX):
+                token = parse_token(queue[len(TOKEN_QUEUE_PREFIX):])
+                if token is not None:
+                    token_queues[queue] = token
+
+        live = live_tokens(token_queues.values())
+        orphaned = sorted(queue for queue, token in token_queues.items() if token not in live)
+
+        if options['dry_run']:
+            for queue in orphaned:
+                self.stdout.write(queue)
+            self.stdout.write(f"{len(orphaned)} of {len(token_queues)} token queues are orphaned.")
+            return
+
+        try:
+            deleted = get_publisher().delete_queues(orphaned)
+        except Exception as e:
+            raise CommandError(f"Error deleting token queues: {e}")
+        self.stdout.write(f"Deleted {deleted} of {len(token_queues)} token queues.")
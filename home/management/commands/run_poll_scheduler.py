@@ -0,0 +1,136 @@
+# home/management/commands/run_poll_scheduler.py
+import json
+import os
+import signal
+import threading
+import time
+import traceback
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from home.ingest import ingest_fetch_result, pollable_terminals
+from utils.parsers import LogParser
+from utils.polling import PollSchedule, TerminalPoller
+
+
+def format_time(value):
+    return datetime.fromtimestamp(value).isoformat(timespec='seconds') if value else None
+
+
+class Command(BaseCommand):
+    help = "Poll roboservice terminals continuously, each on its own adaptive interval."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-interval', type=float, help="Seconds between polls of a terminal that is sending new signals.")
+        parser.add_argument('--max-interval', type=float, help="Seconds between polls of a quiet terminal.")
+        parser.add_argument('--max-backoff', type=float, help="Longest wait before retrying an unreachable terminal.")
+        parser.add_argument('--refresh', type=float, default=300, help="Seconds between reloads of the terminal list.")
+        parser.add_argument('--concurrency', type=int, help="Maximum number of terminals polled at the same time.")
+        parser.add_argument('--per-host', type=int, help="Maximum number of concurrent requests against the same roboservice host.")
+        parser.add_argument('--deadline', type=float, help="Seconds a single terminal may take to return its whole log page.")
+        parser.add_argument('--status-file', default=settings.ROBOSERVICE_POLL_STATUS_FILE,
+                            help="JSON file with the per-terminal schedule, rewritten after every sweep.")
+        parser.add_argument('--show-status', action='store_true', help="Print the schedule of the running scheduler and exit.")
+
+    def handle(self, *args, **options):
+        if options['show_status']:
+            self.show_status(options['status_file'])
+            return
+
+        stop = threading.Event()
+
+        def request_stop(signum, frame):
+            self.stdout.write(f"Received signal {signum}, stopping after the current sweep.")
+            stop.set()
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+        log_parser = LogParser()
+        parse_first_get_and_put = True  # Same parsing behaviour as poll_terminals; see ingest_terminal_logs
+        schedule = PollSchedule(options.get('min_interval'), options.get('max_interval'), options.get('max_backoff'))
+        poller = TerminalPoller(
+            concurrency=options.get('concurrency'),
+            per_host_limit=options.get('per_host'),
+            deadline=options.get('deadline'),
+        )
+        terminals = {}
+        next_refresh = 0
+
+        self.stdout.write("Poll scheduler started.")
+        with poller:
+            while not stop.is_set():
+                # The process lives for days; drop database connections that went away meanwhile
+                close_old_connections()
+
+                now = time.time()
+                if now >= next_refresh:
+                    terminals = {terminal.pk: terminal for terminal in pollable_terminals()}
+                    schedule.sync(terminals, now)
+                    next_refresh = now + options['refresh']
+
+                due = [terminals[terminal_id] for terminal_id in schedule.due(now)]
+                for terminal, result, error in poller.poll(due):
+                    if error is not None:
+                        self.stderr.write(f"Error communicating with terminal {terminal}: {error}")
+                        schedule.record_failure(terminal.pk, error, time.time())
+                        continue
+
+                    try:
+                        new_signals = ingest_fetch_result(terminal, result, log_parser, parse_first_get_and_put)
+                    except Exception as e:
+                        self.stderr.write(f"Error ingesting logs of terminal {terminal}: {e}\n{traceback.format_exc()}")
+                        schedule.record_failure(terminal.pk, e, time.time())
+                        continue
+                    schedule.record_success(terminal.pk, len(new_signals), time.time())
+
+                if due:
+                    self.write_status(options['status_file'], schedule, terminals)
+
+                wake_at = min(filter(None, [schedule.next_due(), next_refresh]))
+                stop.wait(max(0, wake_at - time.time()))
+
+        close_old_connections()
+        self.stdout.write("Poll scheduler stopped.")
+
+    def write_status(self, path, schedule, terminals):
+        status = {
+            'updated_at': format_time(time.time()),
+            'terminals': [
+                {
+                    'terminal_id': terminal_id,
+                    'terminal': str(terminals[terminal_id]),
+                    'interval': round(entry['interval'], 1),
+                    'failures': entry['failures'],
+                    'next_due': format_time(entry['next_due']),
+                    'last_poll': format_time(entry['last_poll']),
+                    'last_error': entry['last_error'],
+                }
+                for terminal_id, entry in sorted(schedule.entries.items(), key=lambda item: item[1]['next_due'])
+            ],
+        }
+        # Write to a temporary file first so readers never see a half-written file
+        temporary_path = f"{path}.tmp"
+        try:
+            with open(temporary_path, 'w', encoding='utf-8') as status_file:
+                json.dump(status, status_file, indent=2)
+            os.replace(temporary_path, path)
+        except OSError as e:
+            self.stderr.write(f"Cannot write scheduler status to {path}: {e}")
+
+    def show_status(self, path):
+        try:
+            with open(path, encoding='utf-8') as status_file:
+                status = json.load(status_file)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read scheduler status from {path}: {e}")
+
+        self.stdout.write(f"Updated at {status['updated_at']}")
+        for entry in status['terminals']:
+            line = f"{entry['next_due']}  every {entry['interval']:>6}s  {entry['terminal']}"
+            if entry['failures']:
+                line += f"  ({entry['failures']} failures: {entry['last_error']})"
+            self.stdout.write(line)
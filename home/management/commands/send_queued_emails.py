@@ -0,0 +1,30 @@
+# home/management/commands/send_queued_emails.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from home.emails import deliver_queued_emails, purge_sent_emails
+from home.outbox import run_outbox_worker
+
+
+class Command(BaseCommand):
+    help = "Send queued emails in batches over one SMTP connection, retrying failed ones with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.EMAIL_OUTBOX_BATCH_SIZE,
+                            help="Emails sent per SMTP connection.")
+        parser.add_argument('--interval', type=float, default=settings.EMAIL_OUTBOX_POLL_INTERVAL,
+                            help="Seconds to wait when no email is queued.")
+        parser.add_argument('--max-attempts', type=int, default=settings.EMAIL_OUTBOX_MAX_ATTEMPTS,
+                            help="Attempts before an email is marked failed.")
+        parser.add_argument('--once', action='store_true', help="Send everything that is due and exit.")
+
+    def handle(self, *args, **options):
+        run_outbox_worker(
+            self,
+            "Email worker",
+            lambda: deliver_queued_emails(options['batch_size'], options['max_attempts']),
+            purge_sent_emails,
+            options['batch_size'],
+            options['interval'],
+            options['once'],
+        )
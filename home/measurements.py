@@ -0,0 +1,74 @@
+# home/measurements.py
+from django.db.models import Avg, Count, Max, Min
+from django.db.models.functions import Trunc
+
+from utils.parsers import parse_signal_measurements
+from .models import SignalMeasurement
+
+# Bucket sizes for downsampled series, finest first, with their length in seconds
+RESOLUTIONS = {
+    'minute': 60,
+    'hour': 60 * 60,
+    'day': 24 * 60 * 60,
+}
+DEFAULT_MAX_POINTS = 2000
+
+
+def build_signal_measurements(terminal, signals):
+    """
+    Return unsaved SignalMeasurement objects for the measurements carried by `signals`.
+
+    Only RX PUT lines are used; the TX line that acknowledges a PUT repeats the same payload.
+    """
+    return [
+        SignalMeasurement(terminal=terminal, signal_key=key, timestamp=signal.timestamp, value=value)
+        for signal in signals
+        if signal.direction == 'RX' and signal.verb == 'PUT'
+        for key, value in parse_signal_measurements(signal.message)
+    ]
+
+
+def pick_resolution(start, end, max_points=DEFAULT_MAX_POINTS):
+    """Return the finest resolution that keeps the series between `start` and `end` under `max_points` buckets."""
+    span = (end - start).total_seconds()
+    for resolution, seconds in RESOLUTIONS.items():
+        if span / seconds <= max_points:
+            return resolution
+    return 'day'
+
+
+def downsample_measurements(terminal, signal_key, start, end, resolution=None, max_points=DEFAULT_MAX_POINTS):
+    """
+    Return the series of one key on one terminal between `start` and `end`, aggregated into buckets.
+
+    Each point is a dict with `bucket` (start of the bucket), `avg`, `min`, `max` and `count`.
+    `resolution` is one of RESOLUTIONS; when omitted it is chosen from the range so the series
+    has at most `max_points` points.
+    """
+    if resolution is None:
+        resolution = pick_resolution(start, end, max_points)
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution {resolution!r}, expected one of {', '.join(RESOLUTIONS)}")
+
+    return list(
+        SignalMeasurement.objects.filter(
+            terminal=terminal,
+            signal_key=signal_key,
+            timestamp__gte=start,
+            timestamp__lt=end,
+        )
+        .annotate(bucket=Trunc('timestamp', resolution))
+        .values('bucket')
+        .annotate(avg=Avg('value'), min=Min('value'), max=Max('value'), count=Count('id'))
+        .order_by('bucket')
+    )
+
+
+def measurement_keys(terminal):
+    """Return the measurement keys recorded for a terminal."""
+    return list(
+        SignalMeasurement.objects.filter(terminal=terminal)
+        .values_list('signal_key', flat=True)
+        .distinct()
+        .order_by('signal_key')
+    )
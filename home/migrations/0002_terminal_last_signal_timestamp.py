@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:13
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def seed_last_signal_timestamp(apps, schema_editor):
+    Terminal = apps.get_model("home", "Terminal")
+    Signal = apps.get_model("home", "Signal")
+    newest = (
+        Signal.objects.filter(terminal=OuterRef("pk"))
+        .values("terminal")
+        .annotate(newest=Max("timestamp"))
+        .values("newest")
+    )
+    Terminal.objects.update(last_signal_timestamp=Subquery(newest))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="terminal",
+            name="last_signal_timestamp",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(seed_last_signal_timestamp, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_signal_summaries(apps, schema_editor):
+    Terminal = apps.get_model("home", "Terminal")
+    Signal = apps.get_model("home", "Signal")
+    TerminalSignalSummary = apps.get_model("home", "TerminalSignalSummary")
+
+    for terminal in (
+        Terminal.objects.filter(signals__isnull=False).distinct().iterator()
+    ):
+        signals = Signal.objects.filter(terminal=terminal)
+        get_signals = signals.filter(message__icontains="GET")
+        put_signals = signals.filter(message__icontains="PUT")
+        latest_get = (
+            get_signals.order_by("-timestamp").values("timestamp", "message").first()
+            or {}
+        )
+        latest_put = (
+            put_signals.order_by("-timestamp").values("timestamp", "message").first()
+            or {}
+        )
+        TerminalSignalSummary.objects.create(
+            terminal=terminal,
+            last_get_timestamp=latest_get.get("timestamp"),
+            last_get_message=latest_get.get("message"),
+            last_put_timestamp=latest_put.get("timestamp"),
+            last_put_message=latest_put.get("message"),
+            signal_count=signals.count(),
+            get_count=get_signals.count(),
+            put_count=put_signals.count(),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0002_terminal_last_signal_timestamp"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TerminalSignalSummary",
+            fields=[
+                (
+                    "terminal",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="signal_summary",
+                        serialize=False,
+                        to="home.terminal",
+                    ),
+                ),
+                ("last_get_timestamp", models.DateTimeField(blank=True, null=True)),
+                ("last_get_message", models.TextField(blank=True, null=True)),
+                ("last_put_timestamp", models.DateTimeField(blank=True, null=True)),
+                ("last_put_message", models.TextField(blank=True, null=True)),
+                ("signal_count", models.BigIntegerField(default=0)),
+                ("get_count", models.BigIntegerField(default=0)),
+                ("put_count", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "terminal_signal_summaries",
+            },
+        ),
+        migrations.RunPython(build_signal_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0003_terminalsignalsummary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="signal",
+            name="ack_result",
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name="signal",
+            name="direction",
+            field=models.CharField(
+                blank=True,
+                choices=[("RX", "RX"), ("TX", "TX")],
+                max_length=2,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="signal",
+            name="dmc",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name="signal",
+            name="operation_code",
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name="signal",
+            name="roundtrip_ms",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="signal",
+            name="station_code",
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name="signal",
+            name="verb",
+            field=models.CharField(blank=True, max_length=10, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="signal",
+            index=models.Index(
+                fields=["terminal", "verb", "timestamp"],
+                name="signal_terminal_verb_ts_idx",
+            ),
+        ),
+    ]
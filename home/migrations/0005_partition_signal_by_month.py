@@ -0,0 +1,136 @@
+# Converts home_signal into a table range-partitioned by month on "timestamp".
+# PostgreSQL only; on other databases the table is left as it is.
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+# Partitions created up front; `manage_signal_partitions` keeps creating them from then on
+MONTHS_AHEAD = 3
+# Monthly partitions reach at most this far back; older rows (e.g. from a terminal with its clock
+# reset to 1970) go to home_signal_default instead of getting one empty partition per month
+MONTHS_BACK = 24
+
+CREATE_MONTHLY_PARTITIONS = """
+DO $$
+DECLARE
+    month_start timestamp := date_trunc(
+        'month',
+        GREATEST(
+            COALESCE((SELECT MIN("timestamp") FROM home_signal_unpartitioned), now()),
+            now() - interval '%(months_back)s months'
+        ) AT TIME ZONE 'UTC'
+    );
+    last_month timestamp := date_trunc('month', now() AT TIME ZONE 'UTC') + interval '%(months_ahead)s months';
+BEGIN
+    WHILE month_start <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE %%I PARTITION OF home_signal FOR VALUES FROM (%%L) TO (%%L)',
+            'home_signal_p' || to_char(month_start, 'YYYYMM'),
+            month_start AT TIME ZONE 'UTC',
+            (month_start + interval '1 month') AT TIME ZONE 'UTC'
+        );
+        month_start := month_start + interval '1 month';
+    END LOOP;
+END $$;
+""" % {
+    "months_ahead": MONTHS_AHEAD,
+    "months_back": MONTHS_BACK,
+}
+
+
+def table_definitions(cursor, table):
+    """Return the unique/foreign key constraints and plain index definitions of `table`."""
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype IN ('u', 'f') ORDER BY contype DESC, conname",
+        [table],
+    )
+    constraints = cursor.fetchall()
+    cursor.execute(
+        """
+        SELECT pg_get_indexdef(pg_index.indexrelid)
+        FROM pg_index
+        WHERE pg_index.indrelid = %s::regclass
+          AND NOT pg_index.indisprimary
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE pg_constraint.conindid = pg_index.indexrelid)
+        """,
+        [table],
+    )
+    index_definitions = [row[0] for row in cursor.fetchall()]
+    return constraints, index_definitions
+
+
+def recreate_definitions(cursor, constraints, index_definitions):
+    for name, definition in constraints:
+        cursor.execute(f'ALTER TABLE home_signal ADD CONSTRAINT "{name}" {definition}')
+    for definition in index_definitions:
+        # Definitions were read while the old table was still called home_signal
+        cursor.execute(definition)
+
+
+def partition_signal_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        constraints, index_definitions = table_definitions(cursor, "home_signal")
+
+        cursor.execute("ALTER TABLE home_signal RENAME TO home_signal_unpartitioned")
+        cursor.execute(
+            "CREATE TABLE home_signal (LIKE home_signal_unpartitioned INCLUDING DEFAULTS) "
+            'PARTITION BY RANGE ("timestamp")'
+        )
+        # Identity columns cannot be used on partitioned tables, so id gets a plain sequence below
+        cursor.execute("ALTER TABLE home_signal ALTER COLUMN id DROP DEFAULT")
+        cursor.execute("CREATE TABLE home_signal_default PARTITION OF home_signal DEFAULT")
+        cursor.execute(CREATE_MONTHLY_PARTITIONS)
+        cursor.execute("INSERT INTO home_signal SELECT * FROM home_signal_unpartitioned")
+        cursor.execute("DROP TABLE home_signal_unpartitioned")
+
+        cursor.execute("CREATE SEQUENCE home_signal_id_seq OWNED BY home_signal.id")
+        cursor.execute(
+            "SELECT setval('home_signal_id_seq', COALESCE((SELECT MAX(id) FROM home_signal), 0) + 1, false)"
+        )
+        cursor.execute("ALTER TABLE home_signal ALTER COLUMN id SET DEFAULT nextval('home_signal_id_seq')")
+
+        # The partition key has to be part of every unique constraint
+        cursor.execute('ALTER TABLE home_signal ADD CONSTRAINT home_signal_pkey PRIMARY KEY (id, "timestamp")')
+        recreate_definitions(cursor, constraints, index_definitions)
+
+
+def unpartition_signal_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        constraints, index_definitions = table_definitions(cursor, "home_signal")
+
+        cursor.execute("ALTER TABLE home_signal RENAME TO home_signal_partitioned")
+        cursor.execute("CREATE TABLE home_signal (LIKE home_signal_partitioned INCLUDING DEFAULTS)")
+        cursor.execute("ALTER TABLE home_signal ALTER COLUMN id DROP DEFAULT")
+        cursor.execute("INSERT INTO home_signal SELECT * FROM home_signal_partitioned")
+        cursor.execute("DROP TABLE home_signal_partitioned CASCADE")
+        cursor.execute("ALTER TABLE home_signal ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY")
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence('home_signal', 'id'), "
+            "COALESCE((SELECT MAX(id) FROM home_signal), 0) + 1, false)"
+        )
+        cursor.execute("ALTER TABLE home_signal ADD CONSTRAINT home_signal_pkey PRIMARY KEY (id)")
+        recreate_definitions(cursor, constraints, index_definitions)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0004_signal_structured_columns"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_signal_table, unpartition_signal_table),
+        migrations.AddIndex(
+            model_name="signal",
+            index=django.contrib.postgres.indexes.BrinIndex(
+                fields=["timestamp"], name="signal_timestamp_brin_idx"
+            ),
+        ),
+    ]
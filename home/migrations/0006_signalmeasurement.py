@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0005_partition_signal_by_month"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SignalMeasurement",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("signal_key", models.CharField(max_length=100)),
+                ("timestamp", models.DateTimeField()),
+                ("value", models.FloatField()),
+                (
+                    "terminal",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="measurements",
+                        to="home.terminal",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "signal_measurements",
+                "unique_together": {("terminal", "signal_key", "timestamp")},
+            },
+        ),
+    ]
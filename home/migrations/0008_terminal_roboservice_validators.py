@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0007_signallimit_user_active_last_triggered"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="terminal",
+            name="roboservice_etag",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name="terminal",
+            name="roboservice_last_modified",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
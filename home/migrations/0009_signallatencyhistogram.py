@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0008_terminal_roboservice_validators"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SignalLatencyHistogram",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("verb", models.CharField(max_length=10)),
+                (
+                    "resolution",
+                    models.CharField(
+                        choices=[("minute", "Minute"), ("hour", "Hour")], max_length=6
+                    ),
+                ),
+                ("bucket_start", models.DateTimeField()),
+                ("counts", models.JSONField(default=list)),
+                ("count", models.IntegerField(default=0)),
+                ("total_ms", models.BigIntegerField(default=0)),
+                ("max_ms", models.IntegerField(default=0)),
+                (
+                    "terminal",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="latency_histograms",
+                        to="home.terminal",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "signal_latency_histograms",
+                "indexes": [
+                    models.Index(
+                        fields=["terminal", "resolution", "bucket_start"],
+                        name="latency_terminal_res_idx",
+                    )
+                ],
+                "unique_together": {("terminal", "verb", "resolution", "bucket_start")},
+            },
+        ),
+    ]
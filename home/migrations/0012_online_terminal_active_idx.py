@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0011_email_outbox"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="onlineuser",
+            index=models.Index(
+                condition=models.Q(
+                    ("is_terminal", True), ("sign_out_time__isnull", True)
+                ),
+                fields=["last_seen"],
+                name="online_terminal_active_idx",
+            ),
+        ),
+    ]
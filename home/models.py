@@ -1,4 +1,5 @@
 from django.db import models
+from django.contrib.postgres.indexes import BrinIndex
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.conf import settings
 from django.utils import timezone
@@ -109,6 +110,9 @@ class Terminal(models.Model):
     is_rom = models.BooleanField(default=False)  # Added is_rom
     delovno_mesto = models.CharField(max_length=100, null=True, blank=True)  # Added delovno_mesto
     postaja = models.CharField(max_length=50, null=True, blank=True)  # Added postaja
+    last_signal_timestamp = models.DateTimeField(null=True, blank=True)  # Newest ingested roboservice log row
+    roboservice_etag = models.CharField(max_length=255, null=True, blank=True)  # Validators of the last ingested log page,
+    roboservice_last_modified = models.CharField(max_length=64, null=True, blank=True)  # sent back on the next poll
 
     class Meta:
         db_table = 'terminals'
@@ -151,9 +155,22 @@ class Signal(models.Model):
     timestamp = models.DateTimeField()  # Remove auto_now_add to use parsed timestamp
     level = models.CharField(max_length=10)  # e.g., INFO, WARNING, ERROR
     message = models.TextField()
+    # Structured columns parsed from `message` at ingest (see utils.parsers.parse_signal_message)
+    direction = models.CharField(max_length=2, choices=[('RX', 'RX'), ('TX', 'TX')], null=True, blank=True)
+    verb = models.CharField(max_length=10, null=True, blank=True)  # e.g., GET, PUT
+    station_code = models.CharField(max_length=20, null=True, blank=True)
+    operation_code = models.CharField(max_length=20, null=True, blank=True)
+    dmc = models.CharField(max_length=100, null=True, blank=True)  # DMC part code
+    ack_result = models.CharField(max_length=50, null=True, blank=True)  # e.g., ACK, OK
+    roundtrip_ms = models.IntegerField(null=True, blank=True)  # Service time reported on TX lines
 
     class Meta:
         unique_together = ('terminal', 'timestamp', 'message')
+        indexes = [
+            models.Index(fields=['terminal', 'verb', 'timestamp'], name='signal_terminal_verb_ts_idx'),
+            # home_signal is partitioned by month (migration 0005); BRIN suits the append-only timestamps
+            BrinIndex(fields=['timestamp'], name='signal_timestamp_brin_idx'),
+        ]
 
     def __str__(self):
         return f"Signal for {self.terminal} at {self.timestamp}"
@@ -161,27 +178,19 @@ class Signal(models.Model):
     @staticmethod
     def get_last_get_request(terminal):
         """Get the timestamp of the last GET request for a specific terminal."""
-        last_get_signal = Signal.objects.filter(
-            terminal=terminal,
-            message__icontains='GET'
-        ).order_by('-timestamp').first()
-        return last_get_signal.timestamp if last_get_signal else None
+        return TerminalSignalSummary.objects.filter(terminal=terminal).values_list('last_get_timestamp', flat=True).first()
 
     @staticmethod
     def get_last_put_request(terminal):
         """Get the timestamp of the last PUT request for a specific terminal."""
-        last_put_signal = Signal.objects.filter(
-            terminal=terminal,
-            message__icontains='PUT'
-        ).order_by('-timestamp').first()
-        return last_put_signal.timestamp if last_put_signal else None
+        return TerminalSignalSummary.objects.filter(terminal=terminal).values_list('last_put_timestamp', flat=True).first()
     
     @property
     def last_get_signal(self):
         """Get the last GET Signal object for this terminal."""
         if not hasattr(self, '_last_get_signal'):
             self._last_get_signal = self.signals.filter(
-                message__icontains='GET'
+                verb='GET'
             ).order_by('-timestamp').first()
         return self._last_get_signal
 
@@ -190,17 +199,91 @@ class Signal(models.Model):
         """Get the last PUT Signal object for this terminal."""
         if not hasattr(self, '_last_put_signal'):
             self._last_put_signal = self.signals.filter(
-                message__icontains='PUT'
+                verb='PUT'
             ).order_by('-timestamp').first()
         return self._last_put_signal
 
 
+class TerminalSignalSummary(models.Model):
+    """
+    Latest GET/PUT signal and ingested row counts per terminal.
+
+    Kept up to date by `home.ingest` on every poll, so overview pages read one row per
+    terminal instead of scanning `Signal`.
+    """
+    terminal = models.OneToOneField(Terminal, on_delete=models.CASCADE, primary_key=True, related_name='signal_summary')
+    last_get_timestamp = models.DateTimeField(null=True, blank=True)
+    last_get_message = models.TextField(null=True, blank=True)
+    last_put_timestamp = models.DateTimeField(null=True, blank=True)
+    last_put_message = models.TextField(null=True, blank=True)
+    signal_count = models.BigIntegerField(default=0)
+    get_count = models.BigIntegerField(default=0)
+    put_count = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'terminal_signal_summaries'
+
+    def __str__(self):
+        return f"Signal summary for {self.terminal}"
+
+
+class SignalMeasurement(models.Model):
+    """
+    One numeric measurement from a PUT payload (see utils.parsers.parse_signal_measurements).
+
+    Filled at ingest from RX PUT signals, so charts can read a series per terminal and key
+    without scanning `Signal.message`.
+    """
+    terminal = models.ForeignKey(Terminal, on_delete=models.CASCADE, related_name='measurements')
+    signal_key = models.CharField(max_length=100)  # e.g., Temperatura
+    timestamp = models.DateTimeField()
+    value = models.FloatField()
+
+    class Meta:
+        db_table = 'signal_measurements'
+        # Also the index for series reads: terminal and key, then a timestamp range
+        unique_together = ('terminal', 'signal_key', 'timestamp')
+
+    def __str__(self):
+        return f"{self.signal_key}={self.value} on {self.terminal} at {self.timestamp}"
+
+
+class SignalLatencyHistogram(models.Model):
+    """
+    Roundtrip times of TX signals per terminal, verb and minute or hour, as fixed-bucket counts.
+
+    `counts[i]` is the number of roundtrips in bucket i of home.latency.LATENCY_BUCKET_BOUNDS.
+    Filled at ingest, so percentiles for a window never rescan `Signal`.
+    """
+    terminal = models.ForeignKey(Terminal, on_delete=models.CASCADE, related_name='latency_histograms')
+    verb = models.CharField(max_length=10)  # e.g., GET, PUT
+    resolution = models.CharField(max_length=6, choices=[('minute', 'Minute'), ('hour', 'Hour')])
+    bucket_start = models.DateTimeField()
+    counts = models.JSONField(default=list)
+    count = models.IntegerField(default=0)
+    total_ms = models.BigIntegerField(default=0)
+    max_ms = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'signal_latency_histograms'
+        unique_together = ('terminal', 'verb', 'resolution', 'bucket_start')
+        indexes = [
+            models.Index(fields=['terminal', 'resolution', 'bucket_start'], name='latency_terminal_res_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.verb} latency on {self.terminal} per {self.resolution} at {self.bucket_start}"
+
     
 class SignalLimit(models.Model):
     terminal = models.ForeignKey(Terminal, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='signal_limits')  # Owner, receives the alerts
     signal_key = models.CharField(max_length=100)  # e.g., @Temperatura
-    limit_value = models.FloatField()
+    limit_value = models.FloatField()  # Alert when a measurement goes above this value
     notification_email = models.EmailField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+    last_triggered_at = models.DateTimeField(null=True, blank=True)  # Last alert, for the cooldown in home.limits
 
     def __str__(self):
         return f"Limit for {self.signal_key} on {self.terminal} - {self.limit_value}"
@@ -220,6 +303,12 @@ class OnlineUser(models.Model):
         indexes = [
             models.Index(fields=['user', 'sign_out_time']),
             models.Index(fields=['terminal', 'sign_out_time']),
+            # Active terminal sessions only, for the offline sweep in home/presence.py
+            models.Index(
+                fields=['last_seen'],
+                name='online_terminal_active_idx',
+                condition=models.Q(sign_out_time__isnull=True, is_terminal=True),
+            ),
         ]
 
     def __str__(self):
@@ -304,6 +393,70 @@ class NotificationStatus(models.Model):
     def __str__(self):
         return f"Notification {self.notification.key} is {self.status}"
 
+class OutboxMessage(models.Model):
+    """
+    Delivery state of a queued message, claimed and retried by the workers in home/outbox.py.
+    """
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('pending', 'Pending'),
+            ('sent', 'Sent'),
+            ('failed', 'Failed'),
+        ],
+        default='pending'
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        abstract = True
+
+class NotificationOutbox(OutboxMessage):
+    """
+    A notification message waiting to be published to RabbitMQ.
+
+    Written in the same transaction as its Notification and published by the
+    dispatch_notifications command, so a slow or unavailable broker never holds up a request.
+    """
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='outbox_messages')
+    routing_key = models.CharField(max_length=255)  # Receiver's ClientToken
+    payload = models.JSONField()
+
+    class Meta:
+        db_table = 'notification_outbox'
+        indexes = [
+            # The dispatcher only ever looks for pending rows that are due
+            models.Index(fields=['next_attempt_at'], name='outbox_pending_idx', condition=models.Q(status='pending')),
+        ]
+
+    def __str__(self):
+        return f"Outbox message for notification {self.notification_id} ({self.status})"
+
+class EmailOutbox(OutboxMessage):
+    """
+    An email waiting to be rendered and sent by the send_queued_emails command (see home/emails.py).
+
+    The template is rendered by the worker from the JSON `context`, so nothing that queues an
+    email waits on template rendering or SMTP.
+    """
+    recipient_email = models.CharField(max_length=254)
+    subject = models.CharField(max_length=255)
+    template = models.CharField(max_length=255)
+    context = models.JSONField(default=dict)
+
+    class Meta:
+        db_table = 'email_outbox'
+        indexes = [
+            models.Index(fields=['next_attempt_at'], name='email_outbox_pending_idx', condition=models.Q(status='pending')),
+        ]
+
+    def __str__(self):
+        return f"Email '{self.subject}' to {self.recipient_email} ({self.status})"
+
 class RoleGroup(models.Model):
     role_group_id = models.AutoField(primary_key=True)
     role_group = models.CharField(max_length=255, unique=True, null=False)
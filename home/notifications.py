@@ -0,0 +1,81 @@
+# home/notifications.py
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .models import ClientToken, Notification, NotificationStatus, User
+from .outbox import enqueue_notifications
+
+# recipient_type values of create_notification that address several users at once
+GROUP_RECIPIENT_TYPES = ('user_group', 'obrat_oddelek_group', 'obrat_oddelek')
+
+
+def group_recipients(recipient_type, target_id, sender):
+    """
+    Return the online users addressed by a group notification, in one query.
+
+    Each user is annotated with `token_id` / `token_value`, the newest valid ClientToken to
+    route the message to (None when the user has no live token).
+    """
+    if recipient_type == 'user_group':
+        # Membership is kept both as UserGroup.members and User.groups
+        members = Q(user_groups__id=target_id) | Q(groups__id=target_id)
+    elif recipient_type == 'obrat_oddelek_group':
+        members = Q(obrat_oddelek_groups__id=target_id)
+    elif recipient_type == 'obrat_oddelek':
+        members = Q(obrat_oddelek_id=target_id)
+    else:
+        raise ValueError(f"Unknown group recipient type {recipient_type!r}")
+
+    now = timezone.now()
+    tokens = (
+        ClientToken.objects.filter(user=OuterRef('pk'))
+        .filter(Q(expires_at__isnull=True) | Q(expires_at__gt=now))
+        .order_by('-created_at')
+    )
+    online = User.objects.filter(
+        onlineuser__sign_out_time__isnull=True,
+        onlineuser__can_receive_notifications=True,
+    )
+    return list(
+        online.filter(members, is_active=True)
+        .exclude(pk=sender.pk)
+        .annotate(
+            token_id=Subquery(tokens.values('id')[:1]),
+            token_value=Subquery(tokens.values('token')[:1]),
+        )
+        .distinct()
+    )
+
+
+def fan_out_notification(sender, recipients, key, content, notify_response_email=False):
+    """
+    Create one notification per recipient and queue them for publishing.
+
+    `recipients` come from `group_recipients`. The notifications, their statuses and the
+    outbox messages (routed to each recipient's token) are written with three bulk INSERTs in
+    one transaction; dispatch_notifications publishes them in batches. Returns
+    `(notifications, queued_count)`.
+    """
+    tokens = {recipient.pk: recipient.token_value for recipient in recipients}
+    with transaction.atomic():
+        notifications = Notification.objects.bulk_create([
+            Notification(
+                key=key,
+                sender_user=sender,
+                receiver_user=recipient,
+                receiver_token_id=recipient.token_id,
+                notification_content=content,
+                notify_response_email=notify_response_email,
+            )
+            for recipient in recipients
+        ])
+        NotificationStatus.objects.bulk_create([
+            NotificationStatus(notification=notification, status='sent')
+            for notification in notifications
+        ])
+        queued = enqueue_notifications([
+            (notification, tokens[notification.receiver_user_id])
+            for notification in notifications
+        ])
+    return notifications, queued
@@ -0,0 +1,220 @@
+# home/outbox.py
+import logging
+import random
+import signal
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from utils.rabbitmq import NOTIFICATIONS_EXCHANGE, BatchPublishError, get_publisher
+from .models import NotificationOutbox
+
+logger = logging.getLogger('home')
+
+PURGE_INTERVAL = 3600  # Seconds between deletions of old sent rows
+
+
+def notification_message(notification):
+    """The message body a client receives for a notification."""
+    return {
+        'notification_id': notification.id,
+        'key': notification.key,
+        'sender_user': notification.sender_user.username,
+        'notification_content': notification.notification_content,
+    }
+
+
+def enqueue_notifications(entries):
+    """
+    Queue `(notification, routing_key)` pairs for the dispatcher; pairs without a routing key are skipped.
+
+    Call this inside the transaction that creates the notifications, so the messages are
+    committed (or rolled back) together with them. Returns the number of queued messages.
+    """
+    messages = NotificationOutbox.objects.bulk_create([
+        NotificationOutbox(
+            notification=notification,
+            routing_key=str(routing_key),
+            payload=notification_message(notification),
+        )
+        for notification, routing_key in entries
+        if routing_key
+    ])
+    return len(messages)
+
+
+def enqueue_notification(notification):
+    """Queue a notification for its receiver_token; returns False when it has none."""
+    if not notification.receiver_token:
+        logger.info(f"Notification {notification.id} has no receiver token and is not queued.")
+        return False
+    return enqueue_notifications([(notification, notification.receiver_token.token)]) == 1
+
+
+def retry_delay(attempts, max_backoff):
+    """Exponential backoff with equal jitter, capped at `max_backoff` seconds."""
+    backoff = min(max_backoff, 2 ** attempts)
+    return backoff / 2 + random.uniform(0, backoff / 2)
+
+
+def claim_batch(model, batch_size, lease):
+    """
+    Claim up to `batch_size` due pending rows of an OutboxMessage model for `lease` seconds.
+
+    Rows are locked with SKIP LOCKED just long enough to push their next_attempt_at `lease`
+    seconds ahead, so the sending happens outside any transaction and other workers skip the
+    claimed rows until the lease runs out. A worker that dies mid-batch leaves its rows to be
+    retried then; `lease` must therefore exceed the time a batch can take.
+    """
+    with transaction.atomic():
+        messages = list(
+            model.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=timezone.now())
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if messages:
+            leased_until = timezone.now() + timedelta(seconds=lease)
+            model.objects.filter(pk__in=[message.pk for message in messages]).update(next_attempt_at=leased_until)
+            for message in messages:
+                message.next_attempt_at = leased_until
+    return messages
+
+
+def settle_batch(model, sent, failed, max_attempts, max_backoff):
+    """
+    Mark `sent` rows sent, and reschedule `failed` rows with backoff or mark them failed.
+
+    Set `last_error` on the failed rows first; a row fails for good after `max_attempts` attempts.
+    """
+    now = timezone.now()
+    for message in failed:
+        message.attempts += 1
+        if message.attempts >= max_attempts:
+            message.status = 'failed'
+            logger.error(f"Giving up on {message} after {message.attempts} attempts: {message.last_error}")
+        else:
+            message.next_attempt_at = now + timedelta(seconds=retry_delay(message.attempts, max_backoff))
+    with transaction.atomic():
+        model.objects.filter(pk__in=[message.pk for message in sent]).update(
+            status='sent', sent_at=now, attempts=F('attempts') + 1, last_error=None,
+        )
+        model.objects.bulk_update(failed, ['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def run_outbox_worker(command, name, work, purge, batch_size, interval, once=False):
+    """
+    The loop of an outbox worker command: `work()` one batch at a time until SIGTERM or SIGINT.
+
+    `work` returns `(sent, failed)` for a batch of at most `batch_size`; `purge` deletes old sent
+    rows and runs every PURGE_INTERVAL seconds. A full batch without failures is followed by the
+    next one straight away; otherwise the worker waits `interval` seconds, or returns if `once`.
+    """
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        command.stdout.write(f"Received signal {signum}, stopping after the current batch.")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    if not once:
+        command.stdout.write(f"{name} started.")
+    next_purge = 0
+    while not stop.is_set():
+        close_old_connections()
+
+        try:
+            sent, failed = work()
+        except Exception as e:
+            command.stderr.write(f"{name}: error handling a batch: {e}\n{traceback.format_exc()}")
+            sent, failed = 0, 0
+        if sent or failed:
+            command.stdout.write(f"{name}: {sent} sent, {failed} rescheduled")
+
+        if time.time() >= next_purge:
+            try:
+                deleted = purge()
+                if deleted:
+                    command.stdout.write(f"{name}: deleted {deleted} old sent messages")
+            except Exception as e:
+                command.stderr.write(f"{name}: error purging sent messages: {e}")
+            next_purge = time.time() + PURGE_INTERVAL
+
+        if sent == batch_size and not failed:
+            continue
+        if once:
+            break
+        stop.wait(interval)
+
+    close_old_connections()
+    if not once:
+        command.stdout.write(f"{name} stopped.")
+
+
+def reroute_to_current_tokens(messages):
+    """
+    Point each message at the current value of its notification's receiver_token.
+
+    Pairing again rotates a token in place, and a web worker's token_cache may still hold the old
+    value when the message is queued; its queue is gone by then. Returns the rerouted messages.
+    """
+    current = dict(
+        NotificationOutbox.objects
+        .filter(pk__in=[message.pk for message in messages], notification__receiver_token__isnull=False)
+        .values_list('pk', 'notification__receiver_token__token')
+    )
+    rerouted = []
+    for message in messages:
+        token = current.get(message.pk)
+        if token is not None and str(token) != message.routing_key:
+            logger.info(f"Notification outbox: rerouting notification {message.notification_id} "
+                        f"from {message.routing_key} to {token}")
+            message.routing_key = str(token)
+            rerouted.append(message)
+    return rerouted
+
+
+def dispatch_outbox(batch_size=None, max_attempts=None):
+    """
+    Publish one batch of due outbox messages and return `(sent, failed)`.
+
+    Messages the broker confirmed are marked sent; the rest are rescheduled with backoff, or
+    marked failed after `max_attempts` (see claim_batch and settle_batch). Messages are routed to
+    the token their notification's receiver has now, not the one it had when queued.
+    """
+    batch_size = batch_size or settings.NOTIFICATION_OUTBOX_BATCH_SIZE
+    max_attempts = max_attempts or settings.NOTIFICATION_OUTBOX_MAX_ATTEMPTS
+
+    messages = claim_batch(NotificationOutbox, batch_size, settings.NOTIFICATION_OUTBOX_LEASE)
+    if not messages:
+        return 0, 0
+    NotificationOutbox.objects.bulk_update(reroute_to_current_tokens(messages), ['routing_key'])
+
+    try:
+        sent = get_publisher().publish_batch(
+            NOTIFICATIONS_EXCHANGE,
+            [(message.routing_key, message.payload) for message in messages],
+        )
+    except BatchPublishError as e:
+        sent = e.sent
+        logger.warning(f"Notification outbox: {sent} of {len(messages)} messages published, then {e.error!r}")
+        for message in messages[sent:]:
+            message.last_error = repr(e.error)
+
+    unsent = messages[sent:]
+    settle_batch(NotificationOutbox, messages[:sent], unsent, max_attempts, settings.NOTIFICATION_OUTBOX_MAX_BACKOFF)
+    return sent, len(unsent)
+
+
+def purge_sent_outbox(now=None):
+    """Delete sent outbox rows older than NOTIFICATION_OUTBOX_RETENTION_DAYS."""
+    cutoff = (now or timezone.now()) - timedelta(days=settings.NOTIFICATION_OUTBOX_RETENTION_DAYS)
+    deleted, _ = NotificationOutbox.objects.filter(status='sent', sent_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,138 @@
+# home/partitions.py
+"""
+Monthly range partitions of the `home_signal` table (PostgreSQL only).
+
+The table is partitioned by `timestamp` in migration 0005. Partitions are named
+`home_signal_pYYYYMM` and cover one UTC month each; `home_signal_default` catches rows
+outside every monthly partition (e.g. terminals with a wrong clock).
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+SIGNAL_TABLE = 'home_signal'
+PARTITION_PREFIX = 'home_signal_p'
+DEFAULT_PARTITION = 'home_signal_default'
+ARCHIVE_PREFIX = 'archive_home_signal_p'
+
+
+def month_floor(value):
+    value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return datetime(month.year + years, month_index + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(month):
+    return f"{PARTITION_PREFIX}{month:%Y%m}"
+
+
+def list_signal_partitions():
+    """Return `{month_start: table_name}` for the monthly partitions attached to home_signal."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = %s::regclass
+            """,
+            [SIGNAL_TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        suffix = name[len(PARTITION_PREFIX):]
+        if name.startswith(PARTITION_PREFIX) and len(suffix) == 6 and suffix.isdigit():
+            partitions[datetime(int(suffix[:4]), int(suffix[4:]), 1, tzinfo=dt_timezone.utc)] = name
+    return partitions
+
+
+def create_signal_partition(month):
+    """Create the partition for `month`, moving any rows for it out of the default partition."""
+    start, end = month, add_months(month, 1)
+    name = partition_name(month)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE "timestamp" >= %s AND "timestamp" < %s)',
+            [start, end],
+        )
+        has_stray_rows = cursor.fetchone()[0]
+
+        if has_stray_rows:
+            # A new partition cannot be created while the default partition holds rows for its range
+            cursor.execute(f'CREATE TEMP TABLE signal_partition_move (LIKE {SIGNAL_TABLE}) ON COMMIT DROP')
+            cursor.execute(
+                f"""
+                WITH moved AS (
+                    DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *
+                )
+                INSERT INTO signal_partition_move SELECT * FROM moved
+                """,
+                [start, end],
+            )
+
+        cursor.execute(
+            f"CREATE TABLE {name} PARTITION OF {SIGNAL_TABLE} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+
+        if has_stray_rows:
+            cursor.execute(f'INSERT INTO {SIGNAL_TABLE} SELECT * FROM signal_partition_move')
+
+    return name
+
+
+def ensure_signal_partitions(months_ahead, now=None):
+    """Make sure partitions exist from the current month through `months_ahead` months ahead."""
+    current_month = month_floor(now or datetime.now(dt_timezone.utc))
+    existing = list_signal_partitions()
+
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current_month, offset)
+        if month not in existing:
+            created.append(create_signal_partition(month))
+    return created
+
+
+def prune_signal_partitions(retention_months, archive=False, now=None, dry_run=False):
+    """
+    Detach partitions that lie entirely before the retention window and drop or archive them.
+
+    Archived partitions are kept as standalone `archive_home_signal_pYYYYMM` tables without
+    foreign keys or defaults, so nothing in home_signal depends on them. Returns the affected partition names.
+    """
+    cutoff = add_months(month_floor(now or datetime.now(dt_timezone.utc)), -retention_months)
+    expired = [name for month, name in sorted(list_signal_partitions().items()) if add_months(month, 1) <= cutoff]
+
+    if dry_run:
+        return expired
+
+    for name in expired:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {SIGNAL_TABLE} DETACH PARTITION {name}')
+            if archive:
+                cursor.execute(
+                    "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+                    [name],
+                )
+                for (constraint_name,) in cursor.fetchall():
+                    cursor.execute(f'ALTER TABLE {name} DROP CONSTRAINT "{constraint_name}"')
+                # The id default points at home_signal's sequence
+                cursor.execute(f'ALTER TABLE {name} ALTER COLUMN id DROP DEFAULT')
+                cursor.execute(f'ALTER TABLE {name} RENAME TO {ARCHIVE_PREFIX}{name[len(PARTITION_PREFIX):]}')
+            else:
+                cursor.execute(f'DROP TABLE {name}')
+
+    if not archive:
+        # Stray old rows in the default partition are few; a plain DELETE is fine for them
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" < %s', [cutoff])
+
+    return expired
@@ -0,0 +1,68 @@
+# home/presence.py
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from utils.rabbitmq import PRESENCE_EXCHANGE, get_publisher
+from .models import OnlineUser, Terminal
+
+logger = logging.getLogger('home')
+
+
+def sweep_offline_terminals(timeout=None, now=None):
+    """
+    Sign out terminal sessions without a heartbeat for `timeout` seconds, in one statement.
+
+    The UPDATE reads only active terminal sessions through the online_terminal_active_idx
+    partial index and returns the rows it changed. Returns a list of
+    `{'online_user_id', 'terminal_id', 'terminal_hostname', 'user_id', 'last_seen'}`.
+    """
+    timeout = settings.OFFLINE_TERMINAL_TIMEOUT if timeout is None else timeout
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=timeout)
+
+    online_users = connection.ops.quote_name(OnlineUser._meta.db_table)
+    terminals = connection.ops.quote_name(Terminal._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH swept AS (
+                UPDATE {online_users}
+                SET sign_out_time = %s
+                WHERE is_terminal AND sign_out_time IS NULL AND last_seen < %s
+                RETURNING id, terminal_id, user_id, last_seen
+            )
+            SELECT swept.id, swept.terminal_id, t.terminal_hostname, swept.user_id, swept.last_seen
+            FROM swept LEFT JOIN {terminals} t ON t.id = swept.terminal_id
+            ORDER BY swept.id
+            """,
+            [now, cutoff],
+        )
+        columns = ['online_user_id', 'terminal_id', 'terminal_hostname', 'user_id', 'last_seen']
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def publish_presence_change(event, terminals, now=None):
+    """Publish one presence event for a group of terminals on the presence fanout exchange."""
+    now = now or timezone.now()
+    get_publisher().publish(
+        PRESENCE_EXCHANGE,
+        '',
+        {
+            'event': event,
+            'at': now.isoformat(),
+            'terminals': [
+                {
+                    'terminal_id': terminal['terminal_id'],
+                    'terminal_hostname': terminal['terminal_hostname'],
+                    'user_id': terminal['user_id'],
+                    'last_seen': terminal['last_seen'].isoformat(),
+                }
+                for terminal in terminals
+            ],
+        },
+        exchange_type='fanout',
+    )
@@ -1,9 +1,12 @@
 # home/signals.py
 
 from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
-from .models import OnlineUser, Terminal
+from .limits import limit_index
+from .models import ClientToken, OnlineUser, SignalLimit, Terminal
+from .tokens import token_cache
 from utils.utils import get_client_ip  # Assuming you have a utility function to get client IP
 
 @receiver(user_logged_in)
@@ -32,3 +35,13 @@ def create_online_user(sender, request, user, **kwargs):
         can_receive_notifications=True
     )
     print(f"OnlineUser created: {online_user}")
+
+@receiver([post_save, post_delete], sender=SignalLimit)
+def invalidate_limit_index(sender, **kwargs):
+    # Other processes (the poller) pick up the change when their index expires
+    limit_index.invalidate()
+
+@receiver([post_save, post_delete], sender=ClientToken)
+def invalidate_token_cache(sender, instance, **kwargs):
+    # Covers pairing, token refresh and the cleanup at logout; other processes wait for their TTL
+    token_cache.invalidate(token_id=instance.pk, token=instance.token, terminal_id=instance.terminal_id)
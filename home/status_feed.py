@@ -0,0 +1,174 @@
+# home/status_feed.py
+import json
+import logging
+import queue
+import threading
+import time
+
+import pika
+from django.conf import settings
+from django.db import connection
+
+from utils.rabbitmq import NOTIFICATION_STATUS_EXCHANGE, BatchPublishError, get_publisher
+
+logger = logging.getLogger('home')
+
+
+def status_event(notification, status, updated_at):
+    """The message published for a NotificationStatus change; what the live pages need to update a row."""
+    return {
+        'notification_id': notification.id,
+        'key': notification.key,
+        'status': status,
+        'updated_at': updated_at.isoformat(),
+        'reply_content': notification.reply_content,
+        'time_replied': notification.time_replied.isoformat() if notification.time_replied else None,
+    }
+
+
+def publish_status_events(events):
+    """Publish status events on the notification_status fanout exchange; best effort, errors are logged."""
+    if not events:
+        return
+    try:
+        get_publisher().publish_batch(NOTIFICATION_STATUS_EXCHANGE, [('', event) for event in events], exchange_type='fanout')
+    except BatchPublishError as e:
+        logger.warning(f"Notification status feed: {e.sent} of {len(events)} events published, then {e.error!r}")
+
+
+class StatusFeed:
+    """
+    Fans notification status events out to the streaming responses of this process.
+
+    One background thread consumes the notification_status exchange through a private,
+    auto-deleted queue and hands every event to each subscriber's in-memory queue, so
+    connected browsers cost neither database queries nor a broker connection each. The
+    thread is started by the first subscriber and reconnects with backoff if the broker
+    goes away. A subscriber that does not keep up gets None and should reload instead.
+
+    Every open stream holds a web server thread, so at most `max_subscribers` are allowed;
+    the rest of the threads stay free for other requests, terminal heartbeats among them.
+    """
+
+    def __init__(self, subscriber_queue_size=100, max_subscribers=None):
+        self.subscriber_queue_size = subscriber_queue_size
+        self.max_subscribers = settings.NOTIFICATION_STREAM_MAX_CONCURRENT if max_subscribers is None else max_subscribers
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread = None
+
+    def subscribe(self):
+        """Return a new subscriber queue, or None when `max_subscribers` are already connected."""
+        subscriber = queue.Queue(maxsize=self.subscriber_queue_size)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._subscribers.add(subscriber)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='notification-status-feed', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def broadcast(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # Too far behind to patch the page event by event
+                self.unsubscribe(subscriber)
+                self._send_overflow(subscriber)
+
+    @staticmethod
+    def _send_overflow(subscriber):
+        try:
+            subscriber.get_nowait()
+        except queue.Empty:
+            pass
+        subscriber.put_nowait(None)
+
+    def _run(self):
+        delay = 1
+        while True:
+            started = time.monotonic()
+            try:
+                self._consume()
+            except Exception as e:
+                logger.warning(f"Notification status feed disconnected ({e!r}), reconnecting in {delay}s")
+            if time.monotonic() - started > 60:
+                # It was connected for a while; this is a new outage
+                delay = 1
+            time.sleep(delay)
+            delay = min(delay * 2, 60)
+
+    def _consume(self):
+        connection = pika.BlockingConnection(pika.ConnectionParameters(
+            host=settings.RABBITMQ_HOST,
+            port=settings.RABBITMQ_PORT,
+            credentials=pika.PlainCredentials(settings.RABBITMQ_USERNAME, settings.RABBITMQ_PASSWORD),
+            heartbeat=settings.RABBITMQ_HEARTBEAT,
+        ))
+        try:
+            channel = connection.channel()
+            channel.exchange_declare(exchange=NOTIFICATION_STATUS_EXCHANGE, exchange_type='fanout', durable=True)
+            queue_name = channel.queue_declare(queue='', exclusive=True, auto_delete=True).method.queue
+            channel.queue_bind(exchange=NOTIFICATION_STATUS_EXCHANGE, queue=queue_name)
+
+            def on_message(ch, method, properties, body):
+                try:
+                    event = json.loads(body)
+                except ValueError:
+                    logger.error(f"Notification status feed: invalid event {body!r}")
+                    return
+                self.broadcast(event)
+
+            channel.basic_consume(queue=queue_name, on_message_callback=on_message, auto_ack=True)
+            channel.start_consuming()
+        finally:
+            if connection.is_open:
+                connection.close()
+
+
+class EventStream:
+    """
+    The server-sent events of one subscriber, ending after NOTIFICATION_STREAM_MAX_AGE seconds.
+
+    Closing it (as the streaming response does, even if it was never iterated) unsubscribes,
+    which gives the subscriber's slot back to the feed.
+    """
+
+    def __init__(self, feed, subscriber):
+        self.feed = feed
+        self.subscriber = subscriber
+
+    def __iter__(self):
+        # Nothing below touches the database; do not hold a connection for the whole stream
+        if not connection.in_atomic_block:
+            connection.close()
+        try:
+            yield f"retry: {settings.NOTIFICATION_STREAM_RETRY * 1000}\n\n"
+            deadline = time.monotonic() + settings.NOTIFICATION_STREAM_MAX_AGE
+            while time.monotonic() < deadline:
+                try:
+                    event = self.subscriber.get(timeout=settings.NOTIFICATION_STREAM_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    # Fell behind; the page reloads instead of patching rows
+                    yield "event: reload\ndata: {}\n\n"
+                    return
+                yield f"event: status\ndata: {json.dumps(event)}\n\n"
+        finally:
+            self.close()
+
+    def close(self):
+        self.feed.unsubscribe(self.subscriber)
+
+
+status_feed = StatusFeed()
@@ -1,3 +1,317 @@
-from django.test import TestCase
+import json
+import uuid
+from unittest import mock
 
-# Create your tests here.
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from home.heartbeats import HeartbeatBuffer
+from home.ingest import ingest_terminal_logs
+from home.management.commands.consume_notifications import NotificationConsumer
+from home.management.commands.manage_signal_partitions import Command as ManageSignalPartitionsCommand
+from home.emails import deliver_queued_emails
+from home.outbox import claim_batch, dispatch_outbox, enqueue_notifications, run_outbox_worker
+from home.models import (
+    ClientToken, EmailOutbox, Notification, NotificationOutbox, NotificationStatus, OnlineUser, Signal, SignalLatencyHistogram, Terminal, TerminalMachine,
+    TerminalSignalSummary, User,
+)
+from home.presence import sweep_offline_terminals
+from home.status_feed import StatusFeed
+from home.tokens import TokenCache
+from utils.parsers import LogParser
+
+
+class NotificationConsumerTests(TestCase):
+
+    def setUp(self):
+        self.sender = User.objects.create(username='sender', email='sender@example.com')
+        self.terminal = Terminal.objects.create(terminal_hostname='TERM-01', label_rom='ROM1')
+        TerminalMachine.objects.create(terminal=self.terminal, machine_name='TR1')
+        TerminalMachine.objects.create(terminal=self.terminal, machine_name='TR2')
+        self.notification = Notification.objects.create(
+            key='N-1',
+            sender_user=self.sender,
+            receiver_terminal=self.terminal,
+            notification_content='Please confirm',
+            notify_response_email=True,
+        )
+        self.consumer = NotificationConsumer()
+        # It would close the test transaction's connection
+        patcher = mock.patch('home.management.commands.consume_notifications.close_old_connections')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reply_from_terminal_queues_response_email(self):
+        self.consumer.update_notification_statuses([(self.notification.id, 'replied', 'Confirmed')])
+
+        self.assertEqual(NotificationStatus.objects.get(notification=self.notification).status, 'replied')
+        self.notification.refresh_from_db()
+        self.assertEqual(self.notification.reply_content, 'Confirmed')
+
+        email = EmailOutbox.objects.get()
+        self.assertEqual(email.recipient_email, 'sender@example.com')
+        self.assertEqual(email.context['terminal_info'], {'terminal_hostname': 'TERM-01', 'machine': 'TR1, TR2'})
+
+    def test_message_failing_on_its_own_is_dead_lettered(self):
+        self.consumer._channel = mock.Mock(is_open=True)
+        self.consumer._batch = [
+            (1, json.dumps({'notification_id': self.notification.id, 'status': 'read'})),
+            (2, b'not json'),
+            (3, json.dumps({'notification_id': self.notification.id, 'status': 'replied', 'user_response': 'Boom'})),
+            (4, json.dumps({'notification_id': self.notification.id, 'status': 'delivered'})),
+        ]
+        apply = self.consumer.update_notification_statuses
+
+        def fail_on_reply(updates):
+            if any(status == 'replied' for _, status, _ in updates):
+                raise RuntimeError('cannot apply')
+            apply(updates)
+
+        with mock.patch.object(self.consumer, 'update_notification_statuses', side_effect=fail_on_reply), \
+                self.assertLogs(level='ERROR') as logs:
+            self.consumer._flush()
+
+        self.assertEqual(
+            self.consumer._channel.basic_nack.call_args_list,
+            [mock.call(delivery_tag=2, requeue=False), mock.call(delivery_tag=3, requeue=False)],
+        )
+        self.consumer._channel.basic_ack.assert_called_once_with(delivery_tag=4, multiple=True)
+        self.assertTrue(any('Boom' in line for line in logs.output))
+        self.assertEqual(NotificationStatus.objects.get(notification=self.notification).status, 'delivered')
+
+
+class NotificationStatusStreamTests(TestCase):
+
+    def setUp(self):
+        feed = StatusFeed(max_subscribers=1)
+        for patcher in (mock.patch('home.views.status_feed', feed), mock.patch.object(StatusFeed, '_run')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def stream(self):
+        return self.client.get(reverse('notification_status_stream'), HTTP_HOST='localhost')
+
+    def test_streams_beyond_the_limit_are_refused_until_one_closes(self):
+        first = self.stream()
+        self.assertEqual(first.status_code, 200)
+
+        refused = self.stream()
+        self.assertEqual(refused.status_code, 503)
+        self.assertEqual(refused['Retry-After'], str(settings.NOTIFICATION_STREAM_MAX_AGE))
+        self.assertTrue(refused.content.startswith(b'retry: '))
+
+        first.close()
+        self.assertEqual(self.stream().status_code, 200)
+
+    def test_poll_returns_current_statuses(self):
+        sender = User.objects.create(username='sender')
+        notification = Notification.objects.create(key='N-1', sender_user=sender, notification_content='Please confirm')
+        NotificationStatus.objects.create(notification=notification, status='read')
+        without_status = Notification.objects.create(key='N-2', sender_user=sender, notification_content='No status')
+
+        response = self.client.get(reverse('notification_status_poll'), {'ids': f'{notification.id},x,{without_status.id}'}, HTTP_HOST='localhost')
+
+        self.assertEqual([(event['notification_id'], event['status']) for event in response.json()['events']], [(notification.id, 'read')])
+
+
+class TokenRotationTests(TestCase):
+    """A terminal pairing again through another process, which this process's cache never hears about."""
+
+    def setUp(self):
+        self.sender = User.objects.create(username='sender')
+        self.terminal = Terminal.objects.create(terminal_hostname='TERM-01')
+        self.token = ClientToken.objects.create(user=User.objects.create(username='TERM-01'), terminal=self.terminal)
+        self.cache = TokenCache(ttl=3600, max_entries=100)
+        self.old_token = self.cache.for_terminal(self.terminal.id).token
+        self.new_token = uuid.uuid4()
+        # A queryset update sends no post_save, like a save in another process
+        ClientToken.objects.filter(pk=self.token.pk).update(token=self.new_token)
+
+    def test_refresh_bypasses_a_stale_entry(self):
+        self.assertEqual(self.cache.for_terminal(self.terminal.id).token, self.old_token)
+        self.assertEqual(self.cache.for_terminal(self.terminal.id, refresh=True).token, self.new_token)
+        self.assertEqual(self.cache.for_terminal(self.terminal.id).token, self.new_token)
+
+    def test_dispatcher_routes_to_the_current_token(self):
+        notification = Notification.objects.create(
+            key='N-1', sender_user=self.sender, receiver_token=self.token, receiver_terminal=self.terminal,
+            notification_content='Please confirm',
+        )
+        enqueue_notifications([(notification, self.old_token)])
+        publisher = mock.Mock()
+        publisher.publish_batch.side_effect = lambda exchange, messages: len(messages)
+
+        with mock.patch('home.outbox.get_publisher', return_value=publisher):
+            self.assertEqual(dispatch_outbox(), (1, 0))
+
+        [(routing_key, payload)] = publisher.publish_batch.call_args.args[1]
+        self.assertEqual(routing_key, str(self.new_token))
+        self.assertEqual(NotificationOutbox.objects.get().routing_key, str(self.new_token))
+
+
+class OutboxWorkerTests(TestCase):
+
+    def setUp(self):
+        self.command = mock.Mock()
+        # Do not replace the test runner's own SIGINT handler
+        patcher = mock.patch('home.outbox.signal.signal')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('home.outbox.close_old_connections')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_full_batches_are_followed_by_the_next_one(self):
+        work = mock.Mock(side_effect=[(2, 0), (2, 0), (1, 0)])
+        purge = mock.Mock(return_value=0)
+
+        run_outbox_worker(self.command, "Worker", work, purge, batch_size=2, interval=60, once=True)
+
+        self.assertEqual(work.call_count, 3)
+        purge.assert_called_once_with()
+
+    def test_batch_with_failures_waits_for_the_next_round(self):
+        work = mock.Mock(return_value=(1, 1))
+
+        run_outbox_worker(self.command, "Worker", work, mock.Mock(return_value=0), batch_size=2, interval=60, once=True)
+
+        work.assert_called_once_with()
+
+    def test_failed_email_is_rescheduled_with_backoff(self):
+        email = EmailOutbox.objects.create(recipient_email='a@example.com', subject='Hi', template='missing.html')
+
+        with self.assertLogs('home', level='ERROR'):
+            self.assertEqual(deliver_queued_emails(max_attempts=3), (0, 1))
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('pending', 1))
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertIn('missing.html', email.last_error)
+
+    def test_claimed_emails_are_leased_while_they_are_sent(self):
+        EmailOutbox.objects.create(recipient_email='a@example.com', subject='Hi', template='notifications/email_template.html')
+        claimed_meanwhile = []
+        connection = mock.Mock()
+        connection.send_messages.side_effect = lambda messages: claimed_meanwhile.extend(claim_batch(EmailOutbox, 10, lease=60))
+
+        with mock.patch('home.emails.get_connection', return_value=connection), \
+                mock.patch('home.emails.render_email', return_value=mock.Mock()):
+            self.assertEqual(deliver_queued_emails(), (1, 0))
+
+        self.assertEqual(claimed_meanwhile, [])
+        self.assertEqual(EmailOutbox.objects.get().status, 'sent')
+
+
+class TerminalPresenceTests(TestCase):
+
+    def test_heartbeat_after_sweep_brings_terminal_back_online(self):
+        terminal = Terminal.objects.create(terminal_hostname='TERM-01')
+        user = User.objects.create(username='TERM-01')
+        now = timezone.now()
+        online_user = OnlineUser.objects.create(user=user, terminal=terminal, is_terminal=True, last_seen=now - timedelta(minutes=5))
+
+        swept = sweep_offline_terminals(timeout=120, now=now)
+        self.assertEqual([row['online_user_id'] for row in swept], [online_user.id])
+        online_user.refresh_from_db()
+        self.assertIsNotNone(online_user.sign_out_time)
+
+        buffer = HeartbeatBuffer(flush_interval=3600)
+        beat = now + timedelta(seconds=1)
+        buffer.record(online_user.id, beat)
+        self.assertEqual(buffer.flush(), 1)
+
+        online_user.refresh_from_db()
+        self.assertIsNone(online_user.sign_out_time)
+        self.assertEqual(online_user.last_seen, beat)
+        self.assertEqual(sweep_offline_terminals(timeout=120, now=beat), [])
+
+    def test_beat_buffered_before_sign_out_keeps_the_session_closed(self):
+        terminal = Terminal.objects.create(terminal_hostname='TERM-01')
+        user = User.objects.create(username='TERM-01')
+        beat = timezone.now() - timedelta(seconds=1)
+        online_user = OnlineUser.objects.create(user=user, terminal=terminal, is_terminal=True, last_seen=beat - timedelta(seconds=30))
+
+        buffer = HeartbeatBuffer(flush_interval=3600)
+        buffer.record(online_user.id, beat)
+        response = self.client.post(reverse('terminal_sign_out'), {'hostname': 'TERM-01'}, HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(buffer.flush(), 1)
+
+        online_user.refresh_from_db()
+        self.assertIsNotNone(online_user.sign_out_time)
+        self.assertEqual(online_user.last_seen, beat)
+
+
+def roboservice_page(rows):
+    """A roboservice log page with `(timestamp, message)` rows, newest first like the real one."""
+    cells = ''.join(
+        f"<tr><td>INFO</td><td>{timestamp:%d.%m.%Y %H:%M:%S}.000</td><td>{message}</td></tr>"
+        for timestamp, message in rows
+    )
+    return f"<html><body><table>{cells}</table></body></html>"
+
+
+class SignalIngestTests(TestCase):
+
+    def setUp(self):
+        self.start = LogParser().local_tz.localize(datetime(2024, 5, 6, 8, 0, 0))
+        self.terminal = Terminal.objects.create(terminal_hostname='TERM-01', roboservice_url='http://term-01/log')
+        self.log_parser = LogParser()
+
+    def rows(self, count, verbs=('GET', 'PUT')):
+        return [
+            (self.start + timedelta(seconds=second), f"RX: {verbs[second % len(verbs)]}|ST1|40|DMC{second}|Tlak=1.{second}")
+            for second in reversed(range(count))
+        ]
+
+    def test_rows_after_the_mark_are_all_ingested(self):
+        self.terminal.last_signal_timestamp = self.start
+        new_signals = ingest_terminal_logs(self.terminal, roboservice_page(self.rows(6)), self.log_parser, parse_first_get_and_put=True)
+
+        self.assertEqual(len(new_signals), 5)
+        self.assertEqual(Signal.objects.filter(terminal=self.terminal).count(), 5)
+        self.assertEqual(self.terminal.last_signal_timestamp, self.start + timedelta(seconds=5))
+
+    def test_first_poll_stops_after_first_get_and_put(self):
+        new_signals = ingest_terminal_logs(self.terminal, roboservice_page(self.rows(6)), self.log_parser, parse_first_get_and_put=True)
+
+        self.assertEqual(len(new_signals), 2)
+
+    def test_overlapping_polls_count_each_row_once(self):
+        rows = [
+            (self.start + timedelta(seconds=second), f"TX ({100 + second} ms): GET|ST1|DMC{second} => ST1|40| 0|OK")
+            for second in reversed(range(4))
+        ]
+        page = roboservice_page(rows)
+        # Both polls started before either stored anything, so both see the same (empty) mark
+        first_poll = Terminal.objects.get(pk=self.terminal.pk)
+        second_poll = Terminal.objects.get(pk=self.terminal.pk)
+
+        self.assertEqual(len(ingest_terminal_logs(first_poll, page, self.log_parser)), 4)
+        self.assertEqual(ingest_terminal_logs(second_poll, page, self.log_parser), [])
+
+        summary = TerminalSignalSummary.objects.get(terminal=self.terminal)
+        self.assertEqual((summary.signal_count, summary.get_count), (4, 4))
+        minute_histograms = SignalLatencyHistogram.objects.filter(terminal=self.terminal, resolution='minute')
+        self.assertEqual(sum(histogram.count for histogram in minute_histograms), 4)
+
+
+class ManageSignalPartitionsArgumentsTests(SimpleTestCase):
+
+    def archive(self, *args):
+        parser = ManageSignalPartitionsCommand().create_parser('manage.py', 'manage_signal_partitions')
+        return parser.parse_args(args).archive
+
+    @override_settings(SIGNAL_ARCHIVE_EXPIRED=True)
+    def test_no_archive_overrides_the_setting(self):
+        self.assertTrue(self.archive())
+        self.assertFalse(self.archive('--no-archive'))
+
+    @override_settings(SIGNAL_ARCHIVE_EXPIRED=False)
+    def test_archive_overrides_the_setting(self):
+        self.assertFalse(self.archive())
+        self.assertTrue(self.archive('--archive'))
@@ -0,0 +1,116 @@
+# home/tokens.py
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ClientToken
+
+_TOKEN_FIELDS = ['id', 'token', 'user_id', 'terminal_id', 'expires_at']
+
+
+class TokenInfo(namedtuple('TokenInfo', _TOKEN_FIELDS)):
+    """What routing and heartbeats need to know about a ClientToken."""
+    __slots__ = ()
+
+    def is_expired(self, now=None):
+        # Same rule as ClientToken.is_expired: a token without expires_at never expires
+        return bool(self.expires_at and (now or timezone.now()) > self.expires_at)
+
+
+def parse_token(value):
+    """Return `value` as a UUID, or None if it is not a valid token."""
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+class TokenCache:
+    """
+    An in-process LRU cache of ClientTokens, looked up by token value or by terminal.
+
+    Entries (including "no such token") are kept for `ttl` seconds and at most `max_entries`
+    are held. home.signals drops the entries of a token whenever it is saved or deleted in this
+    process; other processes see the change once their entry expires. Callers that must not act
+    on a stale entry pass `refresh=True`, and the outbox dispatcher routes by the token row
+    itself, so a stale value never sends a notification to a dead queue.
+    """
+
+    def __init__(self, ttl=None, max_entries=None):
+        self.ttl = settings.CLIENT_TOKEN_CACHE_TTL if ttl is None else ttl
+        self.max_entries = settings.CLIENT_TOKEN_CACHE_SIZE if max_entries is None else max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (loaded_at, TokenInfo or None)
+
+    def _get(self, key, load, refresh=False):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached and not refresh and now - cached[0] < self.ttl:
+                self._entries.move_to_end(key)
+                return cached[1]
+
+        row = load().values(*_TOKEN_FIELDS).first()
+        info = TokenInfo(**row) if row else None
+        with self._lock:
+            self._entries[key] = (now, info)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return info
+
+    def by_token(self, token, refresh=False):
+        """Return the TokenInfo of a token value (str or UUID), or None if it does not exist."""
+        token = parse_token(token)
+        if token is None:
+            return None
+        return self._get(('token', token), lambda: ClientToken.objects.filter(token=token), refresh)
+
+    def for_terminal(self, terminal_id, user_id=None, refresh=False):
+        """Return the newest token of a terminal (optionally of one user), expired or not, or None."""
+        def load():
+            tokens = ClientToken.objects.filter(terminal_id=terminal_id)
+            if user_id is not None:
+                tokens = tokens.filter(user_id=user_id)
+            return tokens.order_by('-created_at')
+
+        return self._get(('terminal', terminal_id, user_id), load, refresh)
+
+    def invalidate(self, token_id=None, token=None, terminal_id=None):
+        """Drop the entries of a token: by its id or value, and every lookup of its terminal."""
+        token = parse_token(token) if token is not None else None
+        with self._lock:
+            for key in [
+                key for key, (loaded_at, info) in self._entries.items()
+                if (info is not None and token_id is not None and info.id == token_id)
+                or (key[0] == 'token' and token is not None and key[1] == token)
+                or (key[0] == 'terminal' and terminal_id is not None and key[1] == terminal_id)
+            ]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+def live_tokens(tokens, now=None, chunk_size=1000):
+    """The subset of `tokens` (UUIDs) that belong to a ClientToken which has not expired."""
+    now = now or timezone.now()
+    tokens = list(tokens)
+    live = set()
+    for start in range(0, len(tokens), chunk_size):
+        live.update(
+            ClientToken.objects
+            .filter(token__in=tokens[start:start + chunk_size])
+            .filter(Q(expires_at__isnull=True) | Q(expires_at__gt=now))
+            .values_list('token', flat=True)
+        )
+    return live
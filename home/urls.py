@@ -46,6 +46,8 @@ urlpatterns = [
     path('notification_sent/', views.notification_sent, name='notification_sent'),
     path('obvestila/', views.obvestila_view, name='obvestila'),
     path('notifications/<int:notification_id>/', views.notification_detail, name='notification_detail'),
+    path('notifications/status_stream/', views.notification_status_stream, name='notification_status_stream'),
+    path('notifications/status_poll/', views.notification_status_poll, name='notification_status_poll'),
     path('terminal_heartbeat/', views.terminal_heartbeat, name='terminal_heartbeat'),
     path('terminal_sign_out/', views.terminal_sign_out, name='terminal_sign_out'),
     path('terminali_overview/', views.terminali_overview, name='terminali_overview'),
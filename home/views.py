@@ -8,7 +8,7 @@ from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, get_user_model, logout
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponseBadRequest, HttpResponse
+from django.http import JsonResponse, HttpResponseBadRequest, HttpResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.template.loader import render_to_string
 from django.urls import reverse
@@ -16,10 +16,17 @@ from django.utils.http import url_has_allowed_host_and_scheme
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
+from django.db import transaction
 
 from .context_processors import obrat_mapping, available_users_processor, user_obrati_oddelki_processor
-from utils.utils import get_long_obrat, get_client_ip, send_notification_via_rabbitmq, generate_and_register_token, register_token_in_rabbitmq, send_notification_email
-
+from utils.utils import get_long_obrat, get_client_ip, generate_and_register_token, register_token_in_rabbitmq, unregister_token_from_rabbitmq
+
+from .notifications import GROUP_RECIPIENT_TYPES, fan_out_notification, group_recipients
+from .emails import queue_notification_email
+from .heartbeats import heartbeat_buffer, terminal_states
+from .status_feed import EventStream, status_event, status_feed
+from .outbox import enqueue_notification, enqueue_notifications
+from .tokens import token_cache
 from .forms import DevelopmentAuthenticationForm, UserForm, GroupForm
 from .models import AplikacijeObratiOddelki, UserAppRole, User, ObratiOddelki, UserGroup, RoleGroupMapping, ObratOddelekGroup, Notification, OnlineUser, Terminal, ClientToken, NotificationStatus
 from pregled_aktivnosti.models import TaskStep, Stepper, Action
@@ -30,7 +37,6 @@ from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 
 import uuid
-import pika
 
 User = get_user_model()
 logger = logging.getLogger('home')
@@ -315,8 +321,11 @@ def pair_terminal(request):
             }
         )
 
+        # The OnlineUser row may be new; the token cache is invalidated by home.signals
+        terminal_states.invalidate(hostname)
+
         # Register the token in RabbitMQ
-        register_token_in_rabbitmq(str(token_obj.token))
+        register_token_in_rabbitmq(str(token_obj.token), token_obj.expires_at)
 
         return JsonResponse({
             'token': str(token_obj.token),
@@ -350,7 +359,7 @@ def notification_detail(request, notification_id):
     notification = get_object_or_404(Notification, id=notification_id)
     
     # Fetch all notifications with the same key
-    related_notifications = Notification.objects.filter(key=notification.key)
+    related_notifications = Notification.objects.filter(key=notification.key).select_related('status')
 
     context = {
         'notification': notification,
@@ -359,59 +368,75 @@ def notification_detail(request, notification_id):
 
     return render(request, 'notifications/notification_detail.html', context)
 
-def print_all_tokens():
-    all_tokens = ClientToken.objects.all()
-    for token in all_tokens:
-        terminal_hostname = token.terminal.terminal_hostname if token.terminal else "None"
-        logger.info(
-            f"Token ID: {token.token}, Terminal: {terminal_hostname}, "
-            f"Expires At: {token.expires_at}, Is Expired: {timezone.now() > token.expires_at}"
-        )
+def notification_status_stream(request):
+    """
+    Server-sent events with NotificationStatus changes, for the notification pages.
+
+    Events come from home.status_feed, so an open page costs no database queries. The
+    stream ends after NOTIFICATION_STREAM_MAX_AGE seconds and the browser reconnects.
+    When this process already serves NOTIFICATION_STREAM_MAX_CONCURRENT streams the
+    request is refused with 503 and the page polls notification_status_poll instead.
+    """
+    subscriber = status_feed.subscribe()
+    if subscriber is None:
+        response = HttpResponse(f"retry: {settings.NOTIFICATION_STREAM_MAX_AGE * 1000}\n\n", status=503, content_type='text/event-stream')
+        response['Retry-After'] = str(settings.NOTIFICATION_STREAM_MAX_AGE)
+        return response
+
+    response = StreamingHttpResponse(EventStream(status_feed, subscriber), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Do not let nginx buffer the stream
+    return response
+
+def notification_status_poll(request):
+    """
+    The current status of the notifications in `ids` (comma separated), as status stream events.
+
+    Used by pages the status stream refused; they poll every `poll_interval` seconds and try
+    the stream again after `retry_stream_after` seconds.
+    """
+    ids = [int(value) for value in request.GET.get('ids', '').split(',') if value.strip().isdigit()][:500]
+    notifications = Notification.objects.filter(id__in=ids, status__isnull=False).select_related('status')
+    return JsonResponse({
+        'events': [status_event(notification, notification.status.status, notification.status.updated_at) for notification in notifications],
+        'poll_interval': settings.NOTIFICATION_STATUS_POLL_INTERVAL,
+        'retry_stream_after': settings.NOTIFICATION_STREAM_MAX_AGE,
+    })
 
 @csrf_exempt
 def terminal_heartbeat(request):
+    """
+    Record that a paired terminal is alive.
+
+    Runs on every beat of every terminal, so it is checked against cached terminal and token
+    state (home/heartbeats.py, home/tokens.py) and last_seen is buffered.
+    """
     if request.method == 'POST':
         hostname = request.POST.get('hostname')
-        token_str = request.POST.get('token')
-        logger.info(f"Received heartbeat for hostname: {hostname} with token: {token_str}")
-
-        try:
-            # Look up the terminal by hostname
-            terminal = Terminal.objects.get(terminal_hostname=hostname)
-            online_user = OnlineUser.objects.filter(terminal=terminal, is_terminal=True).first()
-            
-            if online_user:
-                # Update the last_seen time to indicate active status
-                online_user.last_seen = timezone.now()
-                online_user.save()
-                # logger.info(f"Heartbeat registered for terminal '{hostname}' at {timezone.now()}.")
-                # Find the ClientToken object
-                try:
-                    token_obj = ClientToken.objects.get(user=online_user, token=token_str)
-                    # Check if token is expired
-                    if token_obj.expires_at and token_obj.expires_at < timezone.now():
-                        logger.warning(f"Token for hostname '{hostname}' is expired.")
-                        return JsonResponse({'error': 'Token expired'}, status=401)
-                    else:
-                        # Token is valid, update last_seen
-                        online_user, _ = OnlineUser.objects.update_or_create(
-                            user=online_user,
-                            terminal=token_obj.terminal,
-                            defaults={'last_seen': timezone.now()}
-                        )
-                        logger.info(f"Heartbeat registered for terminal '{hostname}' at {timezone.now()}.")
-                        return JsonResponse({'status': 'success'}, status=200)
-                except ClientToken.DoesNotExist:
-                    logger.warning(f"Invalid token received for hostname '{hostname}'.")
-                    return JsonResponse({'error': 'Invalid token'}, status=401)
-            else:
-                logger.warning(f"No OnlineUser record found for terminal '{hostname}'.")
-                return JsonResponse({'error': 'OnlineUser record not found'}, status=404)
+        token = token_cache.by_token(request.POST.get('token'))
 
-        except Terminal.DoesNotExist:
+        state = terminal_states.get(hostname)
+        if state is None:
             logger.error(f"Terminal with hostname '{hostname}' not found.")
             return JsonResponse({'error': 'Terminal not found'}, status=404)
-    
+        if not state.online_user_id:
+            logger.warning(f"No OnlineUser record found for terminal '{hostname}'.")
+            return JsonResponse({'error': 'OnlineUser record not found'}, status=404)
+        if token is None or token.terminal_id != state.terminal_id or token.user_id != state.user_id:
+            # The terminal may have paired again through another process; check the row itself
+            token = token_cache.by_token(request.POST.get('token'), refresh=True)
+        if token is None or token.terminal_id != state.terminal_id or token.user_id != state.user_id:
+            logger.warning(f"Invalid token received for hostname '{hostname}'.")
+            return JsonResponse({'error': 'Invalid token'}, status=401)
+
+        now = timezone.now()
+        if token.is_expired(now):
+            logger.warning(f"Token for hostname '{hostname}' is expired.")
+            return JsonResponse({'error': 'Token expired'}, status=401)
+
+        heartbeat_buffer.record(state.online_user_id, now)
+        return JsonResponse({'status': 'success'}, status=200)
+
     else:
         logger.warning("Invalid request method received in terminal_heartbeat.")
         return JsonResponse({'error': 'Invalid request method'}, status=400)
@@ -442,40 +467,42 @@ def create_notification(request):
                 sign_out_time__isnull=True
             ).first()
 
-            # Send email if selected
+            # Queue email if selected; send_queued_emails delivers it
             if notify_email:
                 try:
-                    send_notification_email(
+                    queue_notification_email(
                         recipient=receiver_user,
                         subject=f"Obvestilo: {key}",
-                        message_content=content
+                        message_content=content,
+                        sender_user=sender,
                     )
                 except Exception as e:
-                    logger.error(f"Error sending email to {receiver_user.email}: {e}")
+                    logger.error(f"Error queueing email to {receiver_user.email}: {e}")
 
             if online_user:
                 # Check if user can receive notifications
                 can_receive_notifications = online_user.can_receive_notifications
 
-                # Create the notification record without receiver_ip
-                notification = Notification.objects.create(
-                    key=key,
-                    sender_user=sender,
-                    receiver_user=receiver_user,
-                    receiver_token=None,  # Replace with an actual token if needed
-                    receiver_terminal=None,
-                    notification_content=content,
-                )
+                with transaction.atomic():
+                    # Create the notification record without receiver_ip
+                    notification = Notification.objects.create(
+                        key=key,
+                        sender_user=sender,
+                        receiver_user=receiver_user,
+                        receiver_token=None,  # Replace with an actual token if needed
+                        receiver_terminal=None,
+                        notification_content=content,
+                    )
 
-                # Create NotificationStatus with status 'sent'
-                NotificationStatus.objects.create(
-                    notification=notification,
-                    status='sent'
-                )
+                    # Create NotificationStatus with status 'sent'
+                    NotificationStatus.objects.create(
+                        notification=notification,
+                        status='sent'
+                    )
 
-                # Send the notification if user can receive notifications
-                if can_receive_notifications:
-                    send_notification_via_rabbitmq(notification)
+                    # Queue the notification if user can receive notifications; dispatch_notifications publishes it
+                    if can_receive_notifications:
+                        enqueue_notification(notification)
 
                 return JsonResponse({'success': True})
             else:
@@ -491,38 +518,56 @@ def create_notification(request):
                     logger.error(f"Terminal with hostname '{receiver_terminal_hostname}' not found.")
                     return JsonResponse({'success': False, 'error': 'Terminal not found.'}, status=400)
 
-            # Debug print of all tokens
-            print_all_tokens()
-
             # Retrieve the ClientToken for the terminal
-            client_token = ClientToken.objects.filter(
-                terminal=receiver_terminal,
-                expires_at__gt=timezone.now()
-            ).first()
+            client_token = token_cache.for_terminal(receiver_terminal.id)
+            if not client_token or client_token.is_expired():
+                # Paired again through another process? Check the row itself before refusing
+                client_token = token_cache.for_terminal(receiver_terminal.id, refresh=True)
 
-            if not client_token:
+            if not client_token or client_token.is_expired():
                 return JsonResponse({'success': False, 'error': 'No valid token for terminal.'}, status=400)
 
-            # Create the notification with receiver_token
-            notification = Notification.objects.create(
-                key=key,
-                sender_user=sender,
-                receiver_user=None,
-                receiver_token=client_token,
-                receiver_terminal=receiver_terminal,
-                notification_content=content,
-            )
+            with transaction.atomic():
+                # Create the notification with receiver_token
+                notification = Notification.objects.create(
+                    key=key,
+                    sender_user=sender,
+                    receiver_user=None,
+                    receiver_token_id=client_token.id,
+                    receiver_terminal=receiver_terminal,
+                    notification_content=content,
+                )
 
-            # Create NotificationStatus with status 'sent'
-            NotificationStatus.objects.create(
-                notification=notification,
-                status='sent'
-            )
+                # Create NotificationStatus with status 'sent'
+                NotificationStatus.objects.create(
+                    notification=notification,
+                    status='sent'
+                )
 
-            send_notification_via_rabbitmq(notification)  # Send via RabbitMQ
+                enqueue_notifications([(notification, client_token.token)])  # Published via RabbitMQ by dispatch_notifications
 
             return JsonResponse({'success': True})
 
+        elif recipient_type in GROUP_RECIPIENT_TYPES:
+            if recipient_type == 'user_group':
+                target = get_object_or_404(UserGroup, id=request.POST.get('receiver_group'), created_by=sender)
+            elif recipient_type == 'obrat_oddelek_group':
+                target = get_object_or_404(ObratOddelekGroup, id=request.POST.get('receiver_obrat_oddelek_group'))
+            else:
+                target = get_object_or_404(ObratiOddelki, pk=request.POST.get('receiver_obrat_oddelek'))
+
+            recipients = group_recipients(recipient_type, target.pk, sender)
+            if not recipients:
+                return JsonResponse({'success': False, 'error': 'V skupini ni aktivnih uporabnikov.'}, status=400)
+
+            notifications, queued = fan_out_notification(
+                sender, recipients, key, content,
+                notify_response_email=request.POST.get('notify_response_email') == 'true',
+            )
+            logger.info(f"Group notification '{key}' to {recipient_type} {target.pk}: "
+                        f"{len(notifications)} recipients, {queued} queued")
+            return JsonResponse({'success': True, 'recipients': len(notifications), 'queued': queued})
+
         # Handle unknown recipient type
         return JsonResponse({'success': False, 'error': 'Neznana napaka.'}, status=400)
 
@@ -537,6 +582,9 @@ def create_notification(request):
     return render(request, 'notifications/create_notification.html', {
         'online_users': online_users,
         'online_terminals': terminal_info,  # Now passing Terminal instances directly
+        'user_groups': UserGroup.objects.filter(created_by=request.user).order_by('name'),
+        'obrat_oddelek_groups': ObratOddelekGroup.objects.select_related('obrat_oddelek').order_by('name'),
+        'obrati_oddelki': ObratiOddelki.objects.order_by('obrat', 'oddelek'),
     })
 
 def notification_sent(request):
@@ -552,7 +600,7 @@ def obvestila_view(request):
     hours_filter = request.GET.get('hours_filter', '')
 
     # Start with all notifications
-    notifications = Notification.objects.all()
+    notifications = Notification.objects.select_related('status')
 
     # Apply filters if provided
     if key_filter:
@@ -757,22 +805,6 @@ def custom_login(request):
         'client_ip': client_ip,
     })
 
-def unregister_token_from_rabbitmq(token):
-    """Unregister the token from RabbitMQ by deleting the associated queue."""
-    try:
-        credentials = pika.PlainCredentials(settings.RABBITMQ_USERNAME, settings.RABBITMQ_PASSWORD)
-        parameters = pika.ConnectionParameters(host=settings.RABBITMQ_HOST, port=settings.RABBITMQ_PORT, credentials=credentials)
-        connection = pika.BlockingConnection(parameters)
-        channel = connection.channel()
-        
-        queue_name = f'queue_{token}'
-        channel.queue_delete(queue=queue_name)
-        
-        connection.close()
-        print(f"Unregistered token {token} from RabbitMQ")
-    except Exception as e:
-        print(f"Failed to unregister token from RabbitMQ: {e}")
-
 def custom_logout(request):
     print("Custom logout triggered")  # Debug statement to check if the function is called
 
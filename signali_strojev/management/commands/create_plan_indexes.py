@@ -0,0 +1,29 @@
+# signali_strojev/management/commands/create_plan_indexes.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from utils.plan_table import PLAN_INDEXES, PLAN_TABLE
+
+
+class Command(BaseCommand):
+    help = f"Create the indexes the plan lookup needs on {PLAN_TABLE} in the external database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='external_db', help="Database alias holding the plan table.")
+        parser.add_argument('--print-sql', action='store_true', help="Only print the statements.")
+
+    def handle(self, *args, **options):
+        if options['print_sql']:
+            for statement in PLAN_INDEXES.values():
+                self.stdout.write(f"{statement};")
+            return
+
+        # CREATE INDEX CONCURRENTLY cannot run in a transaction; Django's autocommit runs each on its own
+        connection = connections[options['database']]
+        for name, statement in PLAN_INDEXES.items():
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(statement)
+            except Exception as e:
+                raise CommandError(f"Error creating {name}: {e}")
+            self.stdout.write(self.style.SUCCESS(f"{name} is in place."))
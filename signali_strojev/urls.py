@@ -34,6 +34,8 @@ urlpatterns = [
     path('api/', include(router.urls)),
     path('api/team-labels/', get_distinct_team_labels, name='team-labels'),
 
+    path('terminals/<int:terminal_id>/measurements/', views.measurement_series, name='measurement_series'),
+    path('terminals/<int:terminal_id>/latency/', views.latency_stats, name='latency_stats'),
     path('terminals/<int:terminal_id>/manage-limits/', views.manage_limits, name='manage_limits'),
     path('limits/<int:limit_id>/delete/', views.delete_limit, name='delete_limit'),
 ]
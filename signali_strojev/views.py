@@ -7,7 +7,7 @@ from .serializers import TimConfigSerializer, TimDefinitionSerializer, StrojEntr
 from home.models import Terminal, Signal, SignalLimit
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import render, get_object_or_404, redirect
 from django.http import Http404
 from django.http import JsonResponse
 from utils.utils import get_long_obrat, URL_TO_RAW_MAPPING
@@ -22,6 +22,10 @@ from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from django.db.models import Subquery, OuterRef, F, Value, FloatField, DurationField
 from django.db.models.functions import Now, Cast
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from datetime import timedelta
+from home.latency import latency_percentiles
+from home.measurements import downsample_measurements, measurement_keys
 
 # from .utils.data_fetching import fetch_machine_data
 # from .utils.data_processing import process_machine_data
@@ -360,23 +364,13 @@ def terminali_overview(request, safe_obrat=None, safe_oddelek=None, team_label_s
     if is_rom == 'on':
         terminals = terminals.filter(is_rom=True)
 
-    # Annotate terminals with last_get_request, last_get_raw_data, last_put_request, last_put_raw_data
-    last_get_signals = Signal.objects.filter(
-        terminal=OuterRef('pk'),
-        message__icontains='GET'
-    ).order_by('-timestamp')
-
-    last_put_signals = Signal.objects.filter(
-        terminal=OuterRef('pk'),
-        message__icontains='PUT'
-    ).order_by('-timestamp')
-
-    terminals = terminals.annotate(
-        last_get_request=Subquery(last_get_signals.values('timestamp')[:1]),
-        last_get_message=Subquery(last_get_signals.values('message')[:1]),
-        last_put_request=Subquery(last_put_signals.values('timestamp')[:1]),
-        last_put_message=Subquery(last_put_signals.values('message')[:1]),
-    )
+    # Latest GET/PUT per terminal come from the summary table kept up to date at ingest
+    terminals = terminals.select_related('signal_summary').annotate(
+        last_get_request=F('signal_summary__last_get_timestamp'),
+        last_get_message=F('signal_summary__last_get_message'),
+        last_put_request=F('signal_summary__last_put_timestamp'),
+        last_put_message=F('signal_summary__last_put_message'),
+    ).order_by('pk')
 
     # Paginate the terminals
     paginator = Paginator(terminals, 50)  # 50 terminals per page
@@ -412,6 +406,90 @@ def terminali_overview(request, safe_obrat=None, safe_oddelek=None, team_label_s
     return render(request, 'pages/terminali_overview.html', context)
 
 
+def parse_time_window(request, default):
+    """
+    Read the ISO `start`/`end` query parameters; `end` defaults to now and `start` to `end - default`.
+
+    A value that is not a valid datetime comes back as None.
+    """
+    try:
+        end = parse_datetime(request.GET['end']) if request.GET.get('end') else timezone.now()
+    except ValueError:
+        # Well-formed but impossible, e.g. month 13
+        end = None
+    if request.GET.get('start'):
+        try:
+            start = parse_datetime(request.GET['start'])
+        except ValueError:
+            start = None
+    else:
+        start = end - default if end else None
+    if start is not None and timezone.is_naive(start):
+        start = timezone.make_aware(start)
+    if end is not None and timezone.is_naive(end):
+        end = timezone.make_aware(end)
+    return start, end
+
+
+@login_required
+def measurement_series(request, terminal_id):
+    """
+    Downsampled measurement series for charts.
+
+    Query parameters: `key` (e.g. Temperatura), optional ISO `start`/`end` (default: the last
+    24 hours) and `resolution` (minute, hour or day; chosen from the range when omitted).
+    Without `key` the response lists the keys recorded for the terminal.
+    """
+    terminal = get_object_or_404(Terminal, pk=terminal_id)
+    signal_key = request.GET.get('key')
+    if not signal_key:
+        return JsonResponse({'keys': measurement_keys(terminal)})
+
+    start, end = parse_time_window(request, default=timedelta(days=1))
+    if start is None or end is None:
+        return JsonResponse({'error': 'Invalid start or end'}, status=400)
+
+    try:
+        points = downsample_measurements(terminal, signal_key, start, end, resolution=request.GET.get('resolution'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'terminal': terminal.id,
+        'key': signal_key,
+        'points': [
+            {
+                'timestamp': point['bucket'].isoformat(),
+                'avg': point['avg'],
+                'min': point['min'],
+                'max': point['max'],
+                'count': point['count'],
+            }
+            for point in points
+        ],
+    })
+
+
+@login_required
+def latency_stats(request, terminal_id):
+    """
+    Roundtrip percentiles (p50/p95/p99) per verb from the latency histograms.
+
+    Query parameters: optional ISO `start`/`end` (default: the last hour) and `verb` (GET, PUT).
+    """
+    terminal = get_object_or_404(Terminal, pk=terminal_id)
+    start, end = parse_time_window(request, default=timedelta(hours=1))
+    if start is None or end is None:
+        return JsonResponse({'error': 'Invalid start or end'}, status=400)
+
+    return JsonResponse({
+        'terminal': terminal.id,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'verbs': latency_percentiles(terminal, start, end, verb=request.GET.get('verb')),
+    })
+
+
 @login_required
 def manage_limits(request, terminal_id):
     terminal = get_object_or_404(Terminal, pk=terminal_id)
@@ -0,0 +1,111 @@
+# utils/db_engines.py
+import atexit
+import os
+import threading
+
+from django.conf import settings
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL
+
+_lock = threading.Lock()
+_engines = {}  # Django database alias -> Engine
+_metrics = {}  # Django database alias -> pool counters
+_pid = None
+
+
+def database_url(alias):
+    """The SQLAlchemy URL of a Django database alias; SQLALCHEMY_DATABASE_URLS overrides DATABASES."""
+    url = settings.SQLALCHEMY_DATABASE_URLS.get(alias)
+    if url:
+        return url
+    database = settings.DATABASES[alias]
+    return URL.create(
+        'postgresql+psycopg2',
+        username=database.get('USER') or None,
+        password=database.get('PASSWORD') or None,
+        host=database.get('HOST') or None,
+        port=int(database['PORT']) if database.get('PORT') else None,
+        database=database.get('NAME'),
+    )
+
+
+def get_engine(alias='external_db'):
+    """
+    Return this process's pooled engine for a Django database alias, creating it on first use.
+
+    Pool size, overflow, timeout, recycle and pre-ping come from the SQLALCHEMY_POOL_* settings.
+    A child process that inherited engines from its parent (e.g. after a fork) builds its own
+    instead of sharing the parent's sockets.
+    """
+    global _pid
+    with _lock:
+        if _pid != os.getpid():
+            for engine in _engines.values():
+                # The parent still uses these connections; only drop our references to them
+                engine.dispose(close=False)
+            _engines.clear()
+            _metrics.clear()
+            _pid = os.getpid()
+
+        engine = _engines.get(alias)
+        if engine is None:
+            engine = _engines[alias] = create_engine(
+                database_url(alias),
+                pool_size=settings.SQLALCHEMY_POOL_SIZE,
+                max_overflow=settings.SQLALCHEMY_POOL_MAX_OVERFLOW,
+                pool_timeout=settings.SQLALCHEMY_POOL_TIMEOUT,
+                pool_recycle=settings.SQLALCHEMY_POOL_RECYCLE,
+                pool_pre_ping=settings.SQLALCHEMY_POOL_PRE_PING,
+            )
+            _track_pool(alias, engine)
+        return engine
+
+
+def _track_pool(alias, engine):
+    counters = _metrics[alias] = {'connects': 0, 'checkouts': 0, 'checkins': 0, 'invalidations': 0, 'max_checked_out': 0}
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        counters['connects'] += 1
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        counters['checkouts'] += 1
+        counters['max_checked_out'] = max(counters['max_checked_out'], engine.pool.checkedout())
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        counters['checkins'] += 1
+
+    @event.listens_for(engine, 'invalidate')
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        counters['invalidations'] += 1
+
+
+def pool_metrics():
+    """Checkout counters and current pool state of every engine in this process, by alias."""
+    with _lock:
+        engines = dict(_engines) if _pid == os.getpid() else {}
+    return {
+        alias: {
+            **_metrics[alias],
+            'checked_out': engine.pool.checkedout(),
+            'idle': engine.pool.checkedin(),
+            'overflow': engine.pool.overflow(),
+            'size': engine.pool.size(),
+        }
+        for alias, engine in engines.items()
+    }
+
+
+def dispose_engines():
+    """Close the pooled connections of this process; called at exit and from gunicorn's worker_exit."""
+    with _lock:
+        if _pid == os.getpid():
+            for engine in _engines.values():
+                engine.dispose()
+        _engines.clear()
+        _metrics.clear()
+
+
+atexit.register(dispose_engines)
@@ -1,48 +1,194 @@
 # utils/parsers.py
+import io
+import re
 from datetime import datetime
 from bs4 import BeautifulSoup
+from lxml import etree
 import pytz
 
+SIGNAL_MESSAGE_RE = re.compile(r'^(?P<direction>RX|TX)(?:\s*\((?P<roundtrip_ms>\d+)\s*ms\))?:\s*(?P<body>.*)$', re.DOTALL)
+
+
+def _clean(value, max_length):
+    value = value.strip()
+    return value[:max_length] if value else None
+
+
+def parse_signal_message(message):
+    """
+    Split a roboservice log message into the structured Signal columns.
+
+    Handles the two message shapes the terminals produce:
+      RX: GET|<station>|<dmc>
+      TX (199 ms): GET|<station>|<dmc> => <station>|<operation>| 0|OK|...
+      RX: PUT|<station>|<operation>|<dmc>|<measurements>
+      TX (183 ms): PUT|<station>|<operation>|<dmc>|<measurements> => ACK
+
+    Fields that cannot be determined are None.
+    """
+    parsed = {
+        'direction': None,
+        'verb': None,
+        'station_code': None,
+        'operation_code': None,
+        'dmc': None,
+        'ack_result': None,
+        'roundtrip_ms': None,
+    }
+    match = SIGNAL_MESSAGE_RE.match(message.strip())
+    if not match:
+        return parsed
+
+    parsed['direction'] = match.group('direction')
+    if match.group('roundtrip_ms'):
+        parsed['roundtrip_ms'] = int(match.group('roundtrip_ms'))
+
+    request, _, response = match.group('body').partition('=>')
+    request_fields = request.split('|')
+    response_fields = response.split('|') if response.strip() else []
+
+    verb = request_fields[0].strip().upper()
+    if not verb.isalpha():
+        return parsed
+    parsed['verb'] = verb[:10]
+
+    if verb == 'GET':
+        if len(request_fields) > 1:
+            parsed['station_code'] = _clean(request_fields[1], 20)
+        if len(request_fields) > 2:
+            parsed['dmc'] = _clean(request_fields[2], 100)
+        if len(response_fields) > 1:
+            parsed['operation_code'] = _clean(response_fields[1], 20)
+        if len(response_fields) > 3:
+            parsed['ack_result'] = _clean(response_fields[3], 50)
+        elif response_fields:
+            parsed['ack_result'] = _clean(response, 50)
+    else:
+        if len(request_fields) > 1:
+            parsed['station_code'] = _clean(request_fields[1], 20)
+        if len(request_fields) > 2:
+            parsed['operation_code'] = _clean(request_fields[2], 20)
+        if len(request_fields) > 3:
+            parsed['dmc'] = _clean(request_fields[3], 100)
+        if response.strip():
+            parsed['ack_result'] = _clean(response, 50)
+
+    return parsed
+
+
+def parse_signal_measurements(message):
+    """
+    Extract the numeric measurements from a PUT payload as a list of `(key, value)` pairs.
+
+    The payload is the fifth `|` field of a PUT message, a run of `@<key>;<value>` chunks:
+      RX: PUT|20|40|<dmc>|DMC;@Kvaliteta;@Temperatura;25.00@Tesnost zrak;1.620
+    gives [('Temperatura', 25.0), ('Tesnost zrak', 1.62)]. Chunks without a numeric value
+    (e.g. `@Kvaliteta;`) are skipped; the part before the first `@` is not a measurement.
+    """
+    match = SIGNAL_MESSAGE_RE.match(message.strip())
+    if not match:
+        return []
+
+    request = match.group('body').partition('=>')[0]
+    request_fields = request.split('|', 4)
+    if len(request_fields) < 5 or request_fields[0].strip().upper() != 'PUT':
+        return []
+
+    measurements = []
+    for chunk in request_fields[4].split('@')[1:]:
+        key, _, value = chunk.partition(';')
+        key = key.strip()
+        value = value.strip().rstrip(';').replace(',', '.')
+        if not key or not value:
+            continue
+        try:
+            measurements.append((key[:100], float(value)))
+        except ValueError:
+            continue  # Textual values such as OK/NOK are not part of the time series
+    return measurements
+
+
 class LogParser:
-    def parse_html_logs(self, html_content, parse_first_get_and_put=False):
-        soup = BeautifulSoup(html_content, "lxml")  # Use lxml parser for speed
-        logs = []
-        rows = soup.find_all("tr")
+    def __init__(self, streaming=True):
+        # Streaming mode walks the page row by row with lxml instead of building a BeautifulSoup tree
+        self.streaming = streaming
+        self.local_tz = pytz.timezone('Europe/Ljubljana')
+
+    def parse_html_logs(self, html_content, parse_first_get_and_put=False, since=None):
+        """
+        Parse the roboservice HTML log table into dicts with label, timestamp and message.
+
+        The roboservice lists the newest rows first. When `since` (an aware datetime) is
+        given, parsing stops at the first row at or before it, so only rows newer than
+        the previous poll are returned.
+        """
+        return list(self.iter_html_logs(html_content, parse_first_get_and_put=parse_first_get_and_put, since=since))
+
+    def iter_html_logs(self, html_content, parse_first_get_and_put=False, since=None):
+        """Generator version of `parse_html_logs`; stops reading the page as soon as it can."""
+        if self.streaming:
+            rows = self.iter_html_rows(html_content)
+        else:
+            rows = self.iter_soup_rows(html_content)
 
         found_get = False
         found_put = False
 
-        local_tz = pytz.timezone('Europe/Ljubljana')
+        for label, timestamp_str, message in rows:
+            try:
+                # Parse timestamp and localize
+                timestamp = datetime.strptime(timestamp_str, '%d.%m.%Y %H:%M:%S.%f')
+                timestamp = self.local_tz.localize(timestamp)
+            except ValueError:
+                continue  # Skip invalid timestamps
+
+            if since is not None and timestamp <= since:
+                break  # Everything from here on was ingested by an earlier poll
+
+            yield {
+                "label": label,
+                "timestamp": timestamp,  # Already aware datetime
+                "message": message,
+            }
+
+            if parse_first_get_and_put:
+                if not found_get and "GET" in message:
+                    found_get = True
+                if not found_put and "PUT" in message:
+                    found_put = True
+
+                if found_get and found_put:
+                    break  # Stop parsing further
+
+    def iter_html_rows(self, html_content):
+        """
+        Yield `(label, timestamp, message)` cell texts for every table row with at least three cells.
+
+        Uses lxml's incremental parser: each <tr> is handled as soon as it is closed and then
+        discarded, so the full document tree is never held in memory.
+        """
+        if isinstance(html_content, str):
+            html_content = html_content.encode('utf-8')
+        if not html_content.strip():
+            return
+
+        for _, row in etree.iterparse(io.BytesIO(html_content), events=('end',), tag='tr', html=True, recover=True, encoding='utf-8'):
+            cells = [''.join(cell.itertext()).strip() for cell in row.iter('td')]
+            if len(cells) >= 3:
+                yield cells[0], cells[1], cells[2]
+
+            # Drop the processed row and everything before it
+            row.clear()
+            parent = row.getparent()
+            if parent is not None:
+                while row.getprevious() is not None:
+                    del parent[0]
+
+    def iter_soup_rows(self, html_content):
+        """Yield the same rows as `iter_html_rows` from a full BeautifulSoup tree."""
+        soup = BeautifulSoup(html_content, "lxml")  # Use lxml parser for speed
 
-        for row in rows:
+        for row in soup.find_all("tr"):
             cells = row.find_all("td")
             if len(cells) >= 3:
-                label = cells[0].text.strip()
-                timestamp_str = cells[1].text.strip()
-                message = cells[2].text.strip()
-
-                try:
-                    # Parse timestamp and localize
-                    timestamp = datetime.strptime(timestamp_str, '%d.%m.%Y %H:%M:%S.%f')
-                    timestamp = local_tz.localize(timestamp)
-                except ValueError:
-                    continue  # Skip invalid timestamps
-
-                log_entry = {
-                    "label": label,
-                    "timestamp": timestamp,  # Already aware datetime
-                    "message": message,
-                }
-
-                logs.append(log_entry)
-
-                if parse_first_get_and_put:
-                    if not found_get and "GET" in message:
-                        found_get = True
-                    if not found_put and "PUT" in message:
-                        found_put = True
-
-                    if found_get and found_put:
-                        break  # Stop parsing further
-
-        return logs
+                yield cells[0].text.strip(), cells[1].text.strip(), cells[2].text.strip()
@@ -0,0 +1,140 @@
+# utils/plan_table.py
+import logging
+import threading
+import time
+
+import pandas as pd
+from django.conf import settings
+from sqlalchemy import bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.types import Text
+
+from utils.result_cache import table_version
+
+logger = logging.getLogger('home')
+
+PLAN_TABLE = 'plan_norme_tirou1402'
+PLAN_COLUMNS = [
+    'Stroj', 'Sklop', 'Ser. artikel', 'Zap_ope', 'Operacija', 'Opravilo', 'Artikel',
+    'Norma (dan)', 'Proizvodni tempo (kos/uro)', 'Cycle Time mins',
+]
+PAIR_COLUMNS = ['pair_stroj', 'pair_artikel']
+
+# Every plan row whose Stroj, Sklop or Ser. artikel contains a pair's stroj, for the pair's artikel.
+# The pairs are two array parameters, so the statement text is the same for any number of pairs.
+# The plan table is imported from elsewhere and its column types are not ours to rely on, so the
+# compared columns are cast to text, the type of the pairs.
+PLAN_LOOKUP_SQL = text(f'''
+    SELECT p.stroj AS pair_stroj, p.artikel AS pair_artikel,
+           {', '.join(f't."{column}"' for column in PLAN_COLUMNS)}
+    FROM unnest(:stroji, :artikli) AS p(stroj, artikel)
+    JOIN {PLAN_TABLE} t ON t."Artikel"::text = p.artikel
+    WHERE strpos(t."Stroj"::text, p.stroj) > 0
+       OR strpos(t."Sklop"::text, p.stroj) > 0
+       OR strpos(t."Ser. artikel"::text, p.stroj) > 0
+''').bindparams(
+    bindparam('stroji', type_=ARRAY(Text)),
+    bindparam('artikli', type_=ARRAY(Text)),
+)
+
+# Run once on the external database (create_plan_indexes); the lookup joins on "Artikel"::text,
+# which a plain index on "Artikel" only serves when the column is text or varchar
+PLAN_INDEXES = {
+    f'{PLAN_TABLE}_artikel_text_idx': f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {PLAN_TABLE}_artikel_text_idx ON {PLAN_TABLE} (("Artikel"::text))',
+}
+
+
+def stroj_in(rows, column):
+    """Whether the pair_stroj of each of `rows` is a substring of its `column`, as LIKE '%stroj%' matched."""
+    return pd.Series(
+        [isinstance(value, str) and stroj in value for stroj, value in zip(rows['pair_stroj'], rows[column])],
+        index=rows.index,
+        dtype=bool,
+    )
+
+
+class PlanTable:
+    """
+    The rows of plan_norme_tirou1402 matching (stroj, artikel) pairs, kept in memory per process.
+
+    Pairs seen before are answered from memory; only new pairs are looked up, all of them in
+    one PLAN_LOOKUP_SQL round trip. The table's PostgreSQL write counters are checked at most
+    every `version_ttl` seconds, and when they moved everything is dropped and looked up again.
+    refresh() does the same on demand, e.g. right after the plan was imported. At most
+    `max_pairs` pairs are kept; beyond that the ones looked up first are dropped.
+    """
+
+    def __init__(self, alias='external_db', version_ttl=None, max_pairs=None):
+        self.alias = alias
+        self.version_ttl = settings.RESULT_CACHE_VERSION_TTL if version_ttl is None else version_ttl
+        self.max_pairs = settings.PLAN_TABLE_MAX_PAIRS if max_pairs is None else max_pairs
+        self._lock = threading.Lock()
+        self._rows = {}  # (stroj, artikel) -> list of matching rows, PAIR_COLUMNS + PLAN_COLUMNS; oldest first
+        self._version = None
+        self._version_checked_at = None
+        self.lookups = 0
+        self.fetched_pairs = 0
+
+    def refresh(self):
+        """Forget every row and the table version; the next lookups read the table again."""
+        with self._lock:
+            self._rows = {}
+            self._version = None
+
+    def _check_version(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._version_checked_at < self.version_ttl:
+                return
+        version = table_version({self.alias: [PLAN_TABLE]}, f'Plan table {PLAN_TABLE}')
+        with self._lock:
+            if version != self._version:
+                self._rows = {}
+            self._version, self._version_checked_at = version, now
+
+    def rows(self, stroj_artikel_pairs, engine):
+        """
+        A DataFrame of the plan rows matching any of `stroj_artikel_pairs`, one per row and pair.
+
+        pair_stroj and pair_artikel tell which pair a row matched; the other columns are PLAN_COLUMNS.
+        """
+        pairs = {(str(stroj), str(artikel)) for stroj, artikel in stroj_artikel_pairs}
+        self._check_version()
+        with self._lock:
+            cached = self._rows
+            found = {pair: cached[pair] for pair in pairs if pair in cached}
+            self.lookups += 1
+
+        missing = sorted(pairs - found.keys())
+        if missing:
+            fetched = {pair: [] for pair in missing}
+            try:
+                with engine.connect() as connection:
+                    result = connection.execute(PLAN_LOOKUP_SQL, {
+                        'stroji': [stroj for stroj, _ in missing],
+                        'artikli': [artikel for _, artikel in missing],
+                    })
+                    for row in result:
+                        fetched[(row[0], row[1])].append(tuple(row))
+            except Exception:
+                # Callers fall back to reports without plan values; make sure that is noticed
+                logger.exception(f"Plan table {PLAN_TABLE}: lookup of {len(missing)} pairs failed")
+                raise
+            with self._lock:
+                # A refresh in the meantime started a new dict; these rows may predate it
+                if self._rows is cached:
+                    cached.update(fetched)
+                    while len(cached) > self.max_pairs:
+                        del cached[next(iter(cached))]
+                self.fetched_pairs += len(missing)
+            found.update(fetched)
+
+        matched = [row for pair in sorted(pairs) for row in found[pair]]
+        return pd.DataFrame(matched, columns=PAIR_COLUMNS + PLAN_COLUMNS)
+
+    def stats(self):
+        with self._lock:
+            return {'pairs': len(self._rows), 'lookups': self.lookups, 'fetched_pairs': self.fetched_pairs}
+
+
+plan_table = PlanTable()
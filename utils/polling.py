@@ -0,0 +1,182 @@
+# utils/polling.py
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from requests.compat import chardet
+
+# `text` is None when the roboservice answered 304 Not Modified
+FetchResult = namedtuple('FetchResult', ['text', 'etag', 'last_modified'])
+
+
+class TerminalPoller:
+    """
+    Fetches roboservice logs from many terminals concurrently.
+
+    Requests run on a bounded thread pool, at most `per_host_limit` at a time against
+    the same host, and each terminal gets its own `deadline` (seconds) for the whole
+    download. A sweep therefore takes roughly as long as the slowest terminal instead
+    of the sum of all of them. Only the HTTP part runs in worker threads; results are
+    handed back to the calling thread, so database writes stay on one connection.
+
+    Every host gets its own keep-alive session that lives as long as the poller, so
+    repeated sweeps reuse connections. Requests are conditional: the terminal's stored
+    ETag / Last-Modified are sent back, and a 304 comes back as a result without text.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, concurrency=None, per_host_limit=None, deadline=None, connect_timeout=None):
+        self.concurrency = concurrency or settings.ROBOSERVICE_POLL_CONCURRENCY
+        self.per_host_limit = per_host_limit or settings.ROBOSERVICE_POLL_PER_HOST
+        self.deadline = deadline or settings.ROBOSERVICE_POLL_DEADLINE
+        self.connect_timeout = min(connect_timeout or settings.ROBOSERVICE_CONNECT_TIMEOUT, self.deadline)
+        self._hosts = {}
+        self._hosts_lock = threading.Lock()
+
+    def _host(self, url):
+        """Return the `(slot, session)` pair of the URL's host, creating it on first use."""
+        host = urlsplit(url).netloc
+        with self._hosts_lock:
+            if host not in self._hosts:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.per_host_limit, max_retries=0)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._hosts[host] = (threading.BoundedSemaphore(self.per_host_limit), session)
+            return self._hosts[host]
+
+    def close(self):
+        """Close the pooled connections of every host."""
+        with self._hosts_lock:
+            for _, session in self._hosts.values():
+                session.close()
+            self._hosts.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def fetch(self, terminal):
+        """Download the log page of one terminal, enforcing the per-terminal deadline."""
+        headers = {}
+        if terminal.roboservice_etag:
+            headers['If-None-Match'] = terminal.roboservice_etag
+        if terminal.roboservice_last_modified:
+            headers['If-Modified-Since'] = terminal.roboservice_last_modified
+
+        slot, session = self._host(terminal.roboservice_url)
+        with slot:
+            # The deadline starts once the host slot is ours, so queueing behind other
+            # terminals on the same host does not count against this terminal.
+            deadline_at = time.monotonic() + self.deadline
+            with session.get(
+                terminal.roboservice_url,
+                headers=headers,
+                timeout=(self.connect_timeout, self.deadline),
+                stream=True,
+            ) as response:
+                if response.status_code == 304:
+                    response.content  # Read the empty body, otherwise closing the response drops the connection
+                    return FetchResult(None, terminal.roboservice_etag, terminal.roboservice_last_modified)
+                response.raise_for_status()
+                chunks = []
+                for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                    if time.monotonic() > deadline_at:
+                        raise requests.Timeout(f"Deadline of {self.deadline}s exceeded")
+                    chunks.append(chunk)
+                body = b''.join(chunks)
+                # response.apparent_encoding would re-read the already consumed stream
+                encoding = response.encoding or (chardet.detect(body)['encoding'] if chardet else None) or 'utf-8'
+                return FetchResult(
+                    body.decode(encoding, errors='replace'),
+                    response.headers.get('ETag'),
+                    response.headers.get('Last-Modified'),
+                )
+
+    def poll(self, terminals):
+        """
+        Poll all terminals and yield `(terminal, result, error)` tuples in completion order.
+
+        Exactly one of `result` (a FetchResult) and `error` is set for every terminal.
+        """
+        terminals = list(terminals)
+        if not terminals:
+            return
+
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(terminals))) as executor:
+            futures = {executor.submit(self.fetch, terminal): terminal for terminal in terminals}
+            for future in as_completed(futures):
+                terminal = futures[future]
+                try:
+                    yield terminal, future.result(), None
+                except Exception as e:
+                    # Any failure is this terminal's problem; the sweep carries on
+                    yield terminal, None, e
+
+
+class PollSchedule:
+    """
+    Per-terminal poll intervals for the long-running scheduler (run_poll_scheduler).
+
+    A terminal that returned new signals is polled sooner (its interval halves, down to
+    `min_interval`); a quiet one drifts back towards `max_interval`. A terminal that cannot
+    be reached backs off exponentially up to `max_backoff`, with jitter so terminals behind
+    the same dead switch do not all retry at once. Times are `time.time()` seconds.
+    """
+
+    def __init__(self, min_interval=None, max_interval=None, max_backoff=None):
+        self.min_interval = min_interval or settings.ROBOSERVICE_POLL_MIN_INTERVAL
+        self.max_interval = max(max_interval or settings.ROBOSERVICE_POLL_MAX_INTERVAL, self.min_interval)
+        self.max_backoff = max(max_backoff or settings.ROBOSERVICE_POLL_MAX_BACKOFF, self.min_interval)
+        self.entries = {}
+
+    def sync(self, terminal_ids, now):
+        """Track exactly `terminal_ids`; new terminals are due immediately."""
+        terminal_ids = set(terminal_ids)
+        for terminal_id in list(self.entries):
+            if terminal_id not in terminal_ids:
+                del self.entries[terminal_id]
+        for terminal_id in terminal_ids - self.entries.keys():
+            self.entries[terminal_id] = {
+                'interval': self.min_interval,
+                'next_due': now,
+                'failures': 0,
+                'last_poll': None,
+                'last_error': None,
+            }
+
+    def due(self, now):
+        return [terminal_id for terminal_id, entry in self.entries.items() if entry['next_due'] <= now]
+
+    def next_due(self):
+        return min((entry['next_due'] for entry in self.entries.values()), default=None)
+
+    def record_success(self, terminal_id, new_signal_count, now):
+        entry = self.entries[terminal_id]
+        if new_signal_count:
+            entry['interval'] = max(self.min_interval, entry['interval'] / 2)
+        else:
+            entry['interval'] = min(self.max_interval, entry['interval'] * 1.5)
+        entry['failures'] = 0
+        entry['last_poll'] = now
+        entry['last_error'] = None
+        entry['next_due'] = now + entry['interval']
+
+    def record_failure(self, terminal_id, error, now):
+        entry = self.entries[terminal_id]
+        entry['failures'] += 1
+        backoff = min(self.max_backoff, self.min_interval * 2 ** entry['failures'])
+        entry['last_poll'] = now
+        entry['last_error'] = str(error)
+        # Equal jitter: at least half the backoff, the rest random
+        entry['next_due'] = now + backoff / 2 + random.uniform(0, backoff / 2)
+
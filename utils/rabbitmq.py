@@ -0,0 +1,243 @@
+# utils/rabbitmq.py
+import atexit
+import json
+import logging
+import os
+import threading
+from urllib.parse import quote
+
+import pika
+import requests
+from django.conf import settings
+from django.utils import timezone
+from pika.exceptions import AMQPConnectionError, ChannelClosed, ChannelWrongStateError
+
+logger = logging.getLogger('home')
+
+# A dropped connection or channel is reopened; anything else (e.g. a broker nack) is raised
+RECONNECT_ERRORS = (AMQPConnectionError, ChannelClosed, ChannelWrongStateError)
+
+NOTIFICATIONS_EXCHANGE = 'notifications'
+PRESENCE_EXCHANGE = 'presence'  # fanout; terminal online/offline events
+NOTIFICATION_STATUS_EXCHANGE = 'notification_status'  # fanout; status changes for the live notification pages
+
+
+TOKEN_QUEUE_PREFIX = 'queue_'
+
+
+def token_queue_name(token):
+    return f'{TOKEN_QUEUE_PREFIX}{token}'
+
+
+def token_queue_arguments(expires_at, now=None):
+    """
+    Broker-side expiry for the queue of a token valid until `expires_at`.
+
+    Messages live no longer than the token has left, and once nobody has used the queue for
+    that long plus RABBITMQ_TOKEN_QUEUE_GRACE the broker deletes it by itself. Tokens without
+    expires_at get a plain queue; reconcile_token_queues removes it once the token is gone.
+    """
+    if expires_at is None:
+        return None
+    lifetime_ms = max(int(((expires_at - (now or timezone.now())).total_seconds()) * 1000), 1000)
+    return {
+        'x-message-ttl': lifetime_ms,
+        'x-expires': lifetime_ms + settings.RABBITMQ_TOKEN_QUEUE_GRACE * 1000,
+    }
+
+
+def list_queues():
+    """Names of all queues in RABBITMQ_VHOST, from the management HTTP API (AMQP cannot list queues)."""
+    response = requests.get(
+        f"{settings.RABBITMQ_MANAGEMENT_URL.rstrip('/')}/api/queues/{quote(settings.RABBITMQ_VHOST, safe='')}",
+        params={'columns': 'name'},
+        auth=(settings.RABBITMQ_USERNAME, settings.RABBITMQ_PASSWORD),
+        timeout=30,
+    )
+    response.raise_for_status()
+    return [queue['name'] for queue in response.json()]
+
+
+class BatchPublishError(Exception):
+    """Raised by publish_batch when only the first `sent` messages of a batch reached the broker."""
+
+    def __init__(self, sent, error):
+        super().__init__(f"{sent} messages published before {error!r}")
+        self.sent = sent
+        self.error = error
+
+
+class RabbitMQPublisher:
+    """
+    A long-lived RabbitMQ connection and channel shared by everything in one process.
+
+    The connection is opened on first use and kept; exchange and queue declarations are
+    remembered, so a publish on a warm publisher is a single basic_publish plus its
+    publisher confirm. A connection the broker dropped (e.g. idle past the heartbeat) is
+    reopened and the call retried once. All calls are serialized with a lock because pika
+    channels must not be used from several threads at once. After a fork the child opens
+    its own connection instead of sharing the parent's socket.
+    """
+
+    def __init__(self, parameters=None):
+        self._parameters = parameters
+        self._lock = threading.RLock()
+        self._pid = None
+        self._connection = None
+        self._channel = None
+        self._declared = set()
+
+    def _connection_parameters(self):
+        if self._parameters is None:
+            self._parameters = pika.ConnectionParameters(
+                host=settings.RABBITMQ_HOST,
+                port=settings.RABBITMQ_PORT,
+                credentials=pika.PlainCredentials(settings.RABBITMQ_USERNAME, settings.RABBITMQ_PASSWORD),
+                heartbeat=settings.RABBITMQ_HEARTBEAT,
+                blocked_connection_timeout=settings.RABBITMQ_BLOCKED_TIMEOUT,
+            )
+        return self._parameters
+
+    def _channel_for_use(self):
+        if self._pid != os.getpid():
+            # Inherited from the parent process; the socket is not ours to use or close
+            self._connection = self._channel = None
+            self._declared.clear()
+            self._pid = os.getpid()
+
+        if self._connection is not None and self._connection.is_open and self._channel.is_open:
+            # Handles pending heartbeats and notices a connection the broker has closed
+            self._connection.process_data_events(time_limit=0)
+            return self._channel
+
+        self._reset()
+        self._connection = pika.BlockingConnection(self._connection_parameters())
+        self._channel = self._connection.channel()
+        self._channel.confirm_delivery()
+        return self._channel
+
+    def _reset(self):
+        connection, self._connection, self._channel = self._connection, None, None
+        self._declared.clear()
+        if connection is not None and connection.is_open:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def _run(self, operation):
+        """Run `operation(channel)` under the lock, reconnecting and retrying once on a dropped connection."""
+        with self._lock:
+            try:
+                return operation(self._channel_for_use())
+            except RECONNECT_ERRORS as e:
+                logger.warning(f"RabbitMQ connection lost ({e!r}), reconnecting")
+                self._reset()
+                return operation(self._channel_for_use())
+
+    def _declare_exchange(self, channel, exchange, exchange_type='direct'):
+        if ('exchange', exchange) not in self._declared:
+            channel.exchange_declare(exchange=exchange, exchange_type=exchange_type, durable=True)
+            self._declared.add(('exchange', exchange))
+
+    def publish(self, exchange, routing_key, message, exchange_type='direct'):
+        """
+        Publish `message` (JSON-serialisable) persistently and wait for the broker's confirm.
+
+        Raises pika.exceptions.NackError if the broker refuses the message.
+        """
+        body = json.dumps(message)
+
+        def operation(channel):
+            self._declare_exchange(channel, exchange, exchange_type)
+            channel.basic_publish(
+                exchange=exchange,
+                routing_key=routing_key,
+                body=body,
+                properties=pika.BasicProperties(delivery_mode=2, content_type='application/json'),
+            )
+
+        self._run(operation)
+
+    def publish_batch(self, exchange, messages, exchange_type='direct'):
+        """
+        Publish `(routing_key, message)` pairs in order on the shared channel and return how many went out.
+
+        Each message is still confirmed by the broker, but the lock, the exchange declaration and
+        the connection check are paid once for the whole batch. If the connection drops midway the
+        retry continues after the last confirmed message instead of resending the batch. If the
+        batch still fails, BatchPublishError tells how many messages were confirmed before it.
+        """
+        bodies = [(routing_key, json.dumps(message)) for routing_key, message in messages]
+        properties = pika.BasicProperties(delivery_mode=2, content_type='application/json')
+        sent = 0
+
+        def operation(channel):
+            nonlocal sent
+            self._declare_exchange(channel, exchange, exchange_type)
+            for routing_key, body in bodies[sent:]:
+                channel.basic_publish(exchange=exchange, routing_key=routing_key, body=body, properties=properties)
+                sent += 1
+
+        try:
+            self._run(operation)
+        except Exception as e:
+            raise BatchPublishError(sent, e) from e
+        return sent
+
+    def declare_token_queue(self, token, expires_at=None):
+        """
+        Declare the durable queue of a client token and bind it to the notifications exchange.
+
+        With `expires_at` the queue gets broker-side expiry (see token_queue_arguments).
+        """
+        token = str(token)
+        queue = token_queue_name(token)
+        arguments = token_queue_arguments(expires_at)
+
+        def operation(channel):
+            self._declare_exchange(channel, NOTIFICATIONS_EXCHANGE)
+            if ('queue', queue) not in self._declared:
+                channel.queue_declare(queue=queue, durable=True, arguments=arguments)
+                channel.queue_bind(exchange=NOTIFICATIONS_EXCHANGE, queue=queue, routing_key=token)
+                self._declared.add(('queue', queue))
+
+        self._run(operation)
+
+    def delete_token_queue(self, token):
+        self.delete_queues([token_queue_name(token)])
+
+    def delete_queues(self, queues):
+        """Delete `queues` one after another on the shared channel and return how many were deleted."""
+        queues = list(queues)
+        deleted = 0
+
+        def operation(channel):
+            nonlocal deleted
+            for queue in queues[deleted:]:
+                channel.queue_delete(queue=queue)
+                self._declared.discard(('queue', queue))
+                deleted += 1
+
+        self._run(operation)
+        return deleted
+
+    def close(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                self._reset()
+
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def get_publisher():
+    """Return the process-wide RabbitMQPublisher."""
+    global _publisher
+    if _publisher is None:
+        with _publisher_lock:
+            if _publisher is None:
+                _publisher = RabbitMQPublisher()
+                atexit.register(_publisher.close)
+    return _publisher
@@ -0,0 +1,131 @@
+# utils/result_cache.py
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+logger = logging.getLogger('home')
+
+# Every change to a table moves one of these counters
+TABLE_VERSION_SQL = '''
+    SELECT relname, n_tup_ins, n_tup_upd, n_tup_del
+    FROM pg_stat_user_tables
+    WHERE relname IN %s
+    ORDER BY relname
+'''
+
+_MISSING = object()
+
+
+def table_version(source_tables, name):
+    """
+    A short hash of the PostgreSQL write counters of `source_tables` (database alias -> table names).
+
+    Unreadable statistics give a new version every time, so callers never keep stale data for
+    them; databases other than PostgreSQL are skipped. `name` identifies the caller in the log.
+    """
+    counters = []
+    for alias, tables in sorted(source_tables.items()):
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            continue
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(TABLE_VERSION_SQL, [tuple(tables)])
+                counters.append((alias, cursor.fetchall()))
+        except Exception as e:
+            # Unknown version: treat the data as changed rather than fail the page
+            logger.warning(f"{name}: cannot read table statistics of {alias}: {e}")
+            counters.append((alias, time.time()))
+    return hashlib.sha1(repr(counters).encode()).hexdigest()[:12]
+
+
+class ResultCache:
+    """
+    Caches the results of an expensive computation, keyed on its arguments and on the data it read.
+
+    Entries live in the Django cache RESULT_CACHE_ALIAS, whose backend (local memory, file or
+    Redis) and size bound come from settings. `source_tables` maps a database alias to the tables
+    the computation reads. Their PostgreSQL write counters form a data version that is part of
+    every key, so once a source table changes old entries are simply not found any more and age
+    out of the backend. The version is re-read at most every RESULT_CACHE_VERSION_TTL seconds, and
+    PostgreSQL publishes the counters within seconds of a commit. Tables without statistics (views,
+    other databases) rely on RESULT_CACHE_TIMEOUT alone.
+
+    Hits and misses are counted per process and the hit rate is logged every `report_every` lookups.
+    """
+
+    def __init__(self, name, source_tables=None, alias=None, timeout=None, version_ttl=None, report_every=100):
+        self.name = name
+        self.source_tables = source_tables or {}
+        self.alias = alias or settings.RESULT_CACHE_ALIAS
+        self.timeout = settings.RESULT_CACHE_TIMEOUT if timeout is None else timeout
+        self.version_ttl = settings.RESULT_CACHE_VERSION_TTL if version_ttl is None else version_ttl
+        self.report_every = report_every
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = None
+        self.hits = 0
+        self.misses = 0
+
+    def data_version(self):
+        """A short hash of the source tables' write counters; refreshed at most every `version_ttl` seconds."""
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._version_checked_at < self.version_ttl:
+                return self._version
+
+        version = table_version(self.source_tables, f'Result cache {self.name}')
+
+        with self._lock:
+            self._version, self._version_checked_at = version, now
+        return version
+
+    def invalidate(self):
+        """Forget the data version, so the next lookup re-reads it (e.g. right after loading new data)."""
+        with self._lock:
+            self._version = None
+
+    def key(self, key_parts):
+        digest = hashlib.sha1(repr(key_parts).encode()).hexdigest()
+        return f'{self.name}:{self.data_version()}:{digest}'
+
+    def get_or_compute(self, key_parts, compute):
+        """
+        Return the cached result for `key_parts` (a tuple of plain values), or `compute()` and cache it.
+
+        Results must be picklable; None is cached like any other result.
+        """
+        cache = caches[self.alias]
+        key = self.key(key_parts)
+        cached = cache.get(key, default=_MISSING)
+        if cached is not _MISSING:
+            self._count(hit=True)
+            return cached
+
+        self._count(hit=False)
+        result = compute()
+        cache.set(key, result, self.timeout)
+        return result
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            lookups = self.hits + self.misses
+        if lookups % self.report_every == 0:
+            logger.info(f"Result cache {self.name}: {self.hit_rate():.0%} hit rate ({self.hits} hits, {self.misses} misses)")
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {'name': self.name, 'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate()}
+
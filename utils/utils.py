@@ -1,11 +1,7 @@
 # utils/utils.py
-import pika
 from django.conf import settings
-import json
 import uuid
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
-from django.core.mail import send_mail
+from utils.rabbitmq import NOTIFICATIONS_EXCHANGE, get_publisher
 
 # Mappings for obrat and oddelek
 OBRAT_MAPPING = {
@@ -100,25 +96,11 @@ def get_long_obrat(short_name):
     return OBRAT_INVERSE_MAPPING.get(short_name, '')
 
 def send_notification_via_rabbitmq(notification):
-    credentials = pika.PlainCredentials(settings.RABBITMQ_USERNAME, settings.RABBITMQ_PASSWORD)
-    parameters = pika.ConnectionParameters(
-        host=settings.RABBITMQ_HOST,
-        port=settings.RABBITMQ_PORT,
-        credentials=credentials
-    )
-    
-    connection = pika.BlockingConnection(parameters)
-    channel = connection.channel()
-
-    exchange_name = 'notifications'
-    channel.exchange_declare(exchange=exchange_name, exchange_type='direct', durable=True)
-
     if notification.receiver_token:
         routing_key = str(notification.receiver_token.token)
         print(f"Sending notification with routing key: {routing_key}")
     else:
         print("No receiver token found, notification cannot be sent.")
-        connection.close()
         return
 
     message = {
@@ -128,16 +110,8 @@ def send_notification_via_rabbitmq(notification):
         'notification_content': notification.notification_content,
     }
 
-    channel.basic_publish(
-        exchange=exchange_name,
-        routing_key=routing_key,
-        body=json.dumps(message),
-        properties=pika.BasicProperties(
-            delivery_mode=2,
-        )
-    )
-    connection.close()
-
+    # Reuses this process's open connection; returns once the broker confirmed the message
+    get_publisher().publish(NOTIFICATIONS_EXCHANGE, routing_key, message)
 
 def get_client_ip(request):
     # print(f"Request META: {request.META}")
@@ -149,25 +123,17 @@ def get_client_ip(request):
     print(f"Detected client IP: {ip}")
     return ip
 
-def register_token_in_rabbitmq(token):
-    connection = pika.BlockingConnection(
-        pika.ConnectionParameters(
-            host=settings.RABBITMQ_HOST,
-            port=settings.RABBITMQ_PORT,
-            credentials=pika.PlainCredentials(settings.RABBITMQ_USERNAME, settings.RABBITMQ_PASSWORD)
-        )
-    )
-    channel = connection.channel()
-    
-    # Declare an exchange for notifications
-    channel.exchange_declare(exchange='notifications', exchange_type='direct', durable=True)
-    
-    # Bind the token to a queue using the token as the routing key
-    queue_name = f'queue_{token}'
-    channel.queue_declare(queue=queue_name, durable=True)
-    channel.queue_bind(exchange='notifications', queue=queue_name, routing_key=token)
-    
-    connection.close()
+def register_token_in_rabbitmq(token, expires_at=None):
+    # Bind the token to a queue using the token as the routing key; the queue expires with the token
+    get_publisher().declare_token_queue(token, expires_at)
+
+def unregister_token_from_rabbitmq(token):
+    """Unregister the token from RabbitMQ by deleting the associated queue."""
+    try:
+        get_publisher().delete_token_queue(token)
+        print(f"Unregistered token {token} from RabbitMQ")
+    except Exception as e:
+        print(f"Failed to unregister token from RabbitMQ: {e}")
 
 def generate_and_register_token(user, terminal=None, ip_address=None):
     # Generate a unique token
@@ -183,55 +149,10 @@ def generate_and_register_token(user, terminal=None, ip_address=None):
     )
     
     # Register token with RabbitMQ
-    register_token_in_rabbitmq(token)
+    register_token_in_rabbitmq(token, client_token.expires_at)
     
     # return client_token.token
 
-def send_notification_email(recipient, subject, message_content):
-    """
-    Send an email notification to a specified user.
-
-    Parameters:
-    recipient (User): The user to whom the email will be sent. It must have a valid email attribute.
-    subject (str): Subject of the email.
-    message_content (str): Main content of the notification email.
-    """
-    if not recipient.email:
-        raise ValueError("Recipient must have a valid email address")
-
-    # Render the HTML and plain text content
-    html_content = render_to_string("notifications/email_template.html", {
-        'username': recipient.username,
-        'message_content': message_content,
-    })
-    text_content = strip_tags(html_content)
-
-    send_mail(
-        subject=subject,
-        message=text_content,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        recipient_list=[recipient.email],
-        html_message=html_content
-    )
-
-def send_response_email(notification):
-    subject = f"Response to Your Notification: {notification.key}"
-    from_email = settings.DEFAULT_FROM_EMAIL
-    recipient_email = notification.sender_user.email
-
-    # Render email content
-    email_content = render_to_string('email_templates/response_notification_email.html', {
-        'sender': notification.receiver_user,
-        'notification_content': notification.notification_content,
-        'reply_content': notification.reply_content,
-        'timestamp': notification.time_replied,
-        'terminal_info': notification.receiver_terminal,
-        'obrat_oddelek': notification.receiver_user.obrat_oddelek,
-    })
-
-    # Send email
-    send_mail(subject, email_content, from_email, [recipient_email], fail_silently=False)
-
 # from ipware import get_client_ip
 
 # def get_client_ip_ipware(request):